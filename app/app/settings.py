@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.HealthCheckMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -85,9 +86,54 @@ DATABASES = {
         'NAME':os.environ.get('DB_NAME'),
         'USER':os.environ.get('DB_USER'),
         'PASSWORD':os.environ.get('DB_PASS'),
+        # Ping connections before use, whether pooled or persistent
+        'CONN_HEALTH_CHECKS':True,
+        'OPTIONS':{},
     }
 }
 
+# A psycopg connection pool per process, sized for its worker threads.
+# DB_POOL=0 falls back to persistent connections kept for CONN_MAX_AGE.
+if os.environ.get('DB_POOL','1')=='1':
+    DATABASES['default']['OPTIONS']['pool']={
+        'min_size':int(os.environ.get('DB_POOL_MIN_SIZE',2)),
+        'max_size':int(os.environ.get('DB_POOL_MAX_SIZE',10)),
+        'timeout':float(os.environ.get('DB_POOL_TIMEOUT',10)),
+        'max_idle':float(os.environ.get('DB_POOL_MAX_IDLE',300)),
+        'max_lifetime':float(os.environ.get('DB_POOL_MAX_LIFETIME',1800)),
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE']=int(os.environ.get('DB_CONN_MAX_AGE',60))
+# Seconds /readyz waits for each database to answer
+HEALTH_CHECK_TIMEOUT=float(os.environ.get('HEALTH_CHECK_TIMEOUT',2))
+
+
+CACHES = {
+    'default': {
+        'BACKEND':os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION':os.environ.get('CACHE_LOCATION',''),
+    }
+}
+
+RECIPIE_FAST_LIST=os.environ.get('RECIPIE_FAST_LIST')=='1'
+RECIPIE_FRAGMENT_CACHE=os.environ.get('RECIPIE_FRAGMENT_CACHE')=='1'
+# Serve recipie, tag and ingredient reads with async views, for ASGI servers
+RECIPIE_ASYNC_VIEWS=os.environ.get('RECIPIE_ASYNC_VIEWS')=='1'
+
+TOKEN_CACHE_SIZE=int(os.environ.get('TOKEN_CACHE_SIZE',1024))
+TOKEN_CACHE_LOCAL_TTL=int(os.environ.get('TOKEN_CACHE_LOCAL_TTL',30))
+TOKEN_CACHE_TTL=int(os.environ.get('TOKEN_CACHE_TTL',300))
+
+SIGNED_TOKENS=os.environ.get('SIGNED_TOKENS')=='1'
+SIGNED_TOKEN_MAX_AGE=int(os.environ.get('SIGNED_TOKEN_MAX_AGE',300))
+SIGNED_REFRESH_MAX_AGE=int(os.environ.get('SIGNED_REFRESH_MAX_AGE',86400))
+SECRET_KEY_FALLBACKS=[
+    key for key in os.environ.get('SECRET_KEY_FALLBACKS','').split(',') if key
+]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -126,6 +172,16 @@ USE_TZ = True
 STATIC_URL = '/static/static/'
 MEDIA_URL='/static/media/'
 MEDIA_ROOT='/vol/web/media'
+# '' sends files from Django, 'x-accel-redirect' (nginx) or 'x-sendfile'
+# (Apache, lighttpd) leave the transfer to the front-end server
+MEDIA_SENDFILE=os.environ.get('MEDIA_SENDFILE','')
+MEDIA_ACCEL_PREFIX=os.environ.get('MEDIA_ACCEL_PREFIX','/protected-media/')
+MEDIA_MAX_AGE=int(os.environ.get('MEDIA_MAX_AGE',3600))
+
+# Processes rendering image derivatives, 0 renders them in the request
+IMAGE_WORKERS=int(os.environ.get('IMAGE_WORKERS',2))
+IMAGE_MAX_BYTES=int(os.environ.get('IMAGE_MAX_BYTES',20*2**20))
+IMAGE_MAX_PIXELS=int(os.environ.get('IMAGE_MAX_PIXELS',50_000_000))
 STATIC_ROOT='/vol/web/static'
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
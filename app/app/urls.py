@@ -18,8 +18,10 @@ from drf_spectacular.views import (
     SpectacularAPIView,
     SpectacularSwaggerView,
 )
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path,include
+from core.views import db_pool_stats,serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -27,4 +29,6 @@ urlpatterns = [
     path('api/docs/',SpectacularSwaggerView.as_view(url_name='api-schema'),name='api-docs'),
     path('api/user/',include('user.urls')),
     path('api/recipie/',include('recipie.urls')),
+    path('api/db-pool/',db_pool_stats,name='db-pool-stats'),
+    path(f"{settings.MEDIA_URL.lstrip('/')}<path:path>",serve_media,name='media'),
 ]
@@ -0,0 +1,36 @@
+"""Cheap database probes for start-up and readiness checks"""
+import math
+from concurrent.futures import ThreadPoolExecutor
+from django.db import DatabaseError,connections
+
+
+def probe_database(alias,timeout=5):
+    """Run SELECT 1 on a new connection to alias, bypassing any pool.
+
+    A pool would wait for its own checkout timeout, and a probe should
+    not hold one of the connections meant for requests.
+    """
+    connection=connections[alias].copy()
+    options=connection.settings_dict['OPTIONS']
+    options.pop('pool',None)
+    if connection.vendor=='postgresql':
+        options.setdefault('connect_timeout',max(1,math.ceil(timeout)))
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    finally:
+        connection.close()
+
+def probe_databases(aliases,timeout=5):
+    """Probe aliases concurrently, returning {alias: error or None}"""
+    def probe(alias):
+        try:
+            probe_database(alias,timeout)
+        except DatabaseError as exc:
+            return exc
+        return None
+
+    if len(aliases)==1:
+        return {aliases[0]:probe(aliases[0])}
+    with ThreadPoolExecutor(max_workers=len(aliases)) as executor:
+        return dict(zip(aliases,executor.map(probe,aliases)))
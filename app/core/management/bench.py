@@ -0,0 +1,5 @@
+"""Shared helpers for the benchmark commands"""
+
+
+class Rollback(Exception):
+    """Raised to throw away the benchmark data"""
@@ -0,0 +1,177 @@
+"""
+Django command to compare sync and async read views under uvicorn
+"""
+import asyncio
+import contextlib
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand,CommandError
+from rest_framework.authtoken.models import Token
+from core.models import Recipie,Tag
+
+BENCH_EMAIL='bench-async-views@example.com'
+PATHS={
+    'list':'/api/recipie/recipies/',
+    'retrieve':'/api/recipie/recipies/{id}/',
+    'tags':'/api/recipie/tags/',
+}
+
+
+async def _request(reader,writer,request):
+    """Send one keep-alive request and return its status"""
+    writer.write(request)
+    await writer.drain()
+    head=await reader.readuntil(b'\r\n\r\n')
+    length=0
+    for line in head.split(b'\r\n'):
+        if line.lower().startswith(b'content-length:'):
+            length=int(line.split(b':',1)[1])
+    await reader.readexactly(length)
+    return int(head.split(b' ',2)[1])
+
+async def _connection(port,request,deadline,latencies,errors):
+    """Send requests over one connection until the deadline"""
+    reader,writer=await asyncio.open_connection('127.0.0.1',port)
+    try:
+        while time.perf_counter()<deadline:
+            started=time.perf_counter()
+            if await _request(reader,writer,request)!=200:
+                errors.append(1)
+            latencies.append(time.perf_counter()-started)
+    finally:
+        writer.close()
+
+async def _load(port,request,connections,duration):
+    """Return (requests/s, p50 ms, p99 ms, errors) for one concurrency level"""
+    latencies,errors=[],[]
+    deadline=time.perf_counter()+duration
+    await asyncio.gather(*[
+        _connection(port,request,deadline,latencies,errors)
+        for _ in range(connections)
+    ])
+    latencies.sort()
+    p99=latencies[min(len(latencies)-1,int(len(latencies)*0.99))]
+    return (
+        len(latencies)/duration,
+        statistics.median(latencies)*1000,
+        p99*1000,
+        len(errors),
+    )
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the async views against the sync ones.
+
+    Seeds a user with recipies, then starts uvicorn once with the sync
+    views and once with RECIPIE_ASYNC_VIEWS=1, both without a cache, and
+    measures throughput at each concurrency level. The seeded rows are
+    removed afterwards.
+    """
+    help='Compare uvicorn throughput of the sync and async read views'
+
+    def add_arguments(self,parser):
+        parser.add_argument(
+            '--connections',type=int,nargs='+',default=[1,10,50,100,500],
+            help='Concurrent keep-alive connections to measure',
+        )
+        parser.add_argument('--duration',type=float,default=5,help='Seconds per level')
+        parser.add_argument('--path',choices=sorted(PATHS),default='list')
+        parser.add_argument('--recipies',type=int,default=50)
+        parser.add_argument('--port',type=int,default=8765)
+
+    def handle(self,*args,**options):
+        """Entrypoint for command"""
+        try:
+            import uvicorn  # noqa: F401
+        except ImportError:
+            raise CommandError('The benchmark needs uvicorn, pip install uvicorn')
+        user,token,recipie_id=self._seed(options['recipies'])
+        path=PATHS[options['path']].format(id=recipie_id)
+        request=(
+            f'GET {path} HTTP/1.1\r\nHost: localhost\r\n'
+            f'Authorization: Token {token}\r\nAccept: application/json\r\n\r\n'
+        ).encode()
+        try:
+            results={}
+            for mode in ('sync','async'):
+                with self._server(mode,options['port']):
+                    results[mode]=[
+                        asyncio.run(_load(options['port'],request,connections,options['duration']))
+                        for connections in options['connections']
+                    ]
+        finally:
+            user.delete()
+        self._report(options['connections'],results)
+
+    def _seed(self,count):
+        """Create the benchmark user, token and recipies"""
+        get_user_model().objects.filter(email=BENCH_EMAIL).delete()
+        user=get_user_model().objects.create_user(BENCH_EMAIL,'benchpass123')
+        tags=[Tag.objects.create(user=user,name=f'Bench {i}') for i in range(5)]
+        recipies=Recipie.objects.bulk_create([
+            Recipie(user=user,title=f'Bench {i}',time_minutes=i%60+1,price=Decimal('4.50'))
+            for i in range(count)
+        ])
+        through=Recipie.tags.through
+        through.objects.bulk_create([
+            through(recipie_id=recipie.id,tag_id=tag.id)
+            for recipie in recipies for tag in tags[:recipie.id%5+1]
+        ])
+        return user,Token.objects.create(user=user).key,recipies[0].id
+
+    @contextlib.contextmanager
+    def _server(self,mode,port):
+        """Run uvicorn with the sync or async views"""
+        # Without a cache the list responses are not served from it, so the
+        # run times the ORM and serializers rather than cache hits
+        env=dict(
+            os.environ,
+            RECIPIE_ASYNC_VIEWS='1' if mode=='async' else '0',
+            CACHE_BACKEND='django.core.cache.backends.dummy.DummyCache',
+        )
+        process=subprocess.Popen(
+            [sys.executable,'-m','uvicorn','app.asgi:application',
+             '--port',str(port),'--no-access-log','--log-level','warning'],
+            cwd=settings.BASE_DIR,
+            env=env,
+        )
+        try:
+            self._wait_for_port(port,process)
+            yield process
+        finally:
+            process.terminate()
+            process.wait()
+            
+    def _wait_for_port(self,port,process,timeout=30):
+        deadline=time.monotonic()+timeout
+        while time.monotonic()<deadline:
+            if process.poll() is not None:
+                raise CommandError('uvicorn exited before accepting connections')
+            try:
+                socket.create_connection(('127.0.0.1',port),timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise CommandError(f'uvicorn did not listen on port {port}')
+
+    def _report(self,levels,results):
+        """Write a table of throughput and latency per concurrency level"""
+        self.stdout.write(
+            f"{'connections':>11} {'mode':>5} {'req/s':>9} {'p50 ms':>8} "
+            f"{'p99 ms':>8} {'errors':>6}"
+        )
+        for i,connections in enumerate(levels):
+            for mode in ('sync','async'):
+                rate,p50,p99,errors=results[mode][i]
+                self.stdout.write(
+                    f'{connections:>11} {mode:>5} {rate:>9.1f} {p50:>8.1f} {p99:>8.1f} {errors:>6}'
+                )
+            speedup=results['async'][i][0]/results['sync'][i][0]
+            self.stdout.write(self.style.SUCCESS(f'{connections:>11} async/sync {speedup:.2f}x'))
@@ -0,0 +1,99 @@
+"""
+Django command to compare RecipieSerializer with the fast list reader
+"""
+import time
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Prefetch
+from core.management.bench import Rollback
+from core.models import Recipie,Tag,Ingredient
+from recipie.readers import RecipieListReader
+from recipie.serializers import RecipieSerializer
+
+class Command(BaseCommand):
+    """Django command to benchmark rendering of the recipie list"""
+    help='Time RecipieSerializer against RecipieListReader in a rolled back transaction'
+    
+    def add_arguments(self,parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            nargs='+',
+            default=[1_000,10_000,100_000],
+        )
+        
+    def handle(self,*args,**options):
+        """Entrypoint for command"""
+        try:
+            with transaction.atomic():
+                user=self._seed(max(options['rows']))
+                for rows in sorted(options['rows']):
+                    self._compare(user,rows)
+                raise Rollback
+        except Rollback:
+            self.stdout.write(self.style.SUCCESS('Benchmark data rolled back'))
+            
+    def _seed(self,rows):
+        """Create a user owning rows recipies with tags and ingredients"""
+        user=get_user_model().objects.create_user('bench@example.com','benchpass123')
+        tags=Tag.objects.bulk_create(
+            [Tag(user=user,name=f'Tag {i}') for i in range(20)]
+        )
+        ingredients=Ingredient.objects.bulk_create(
+            [Ingredient(user=user,name=f'Ingredient {i}') for i in range(50)]
+        )
+        recipies=Recipie.objects.bulk_create(
+            [
+                Recipie(
+                    user=user,
+                    title=f'Recipie {i}',
+                    time_minutes=i%120,
+                    price=Decimal('9.99'),
+                    link='https://example.com/recipie.pdf',
+                )
+                for i in range(rows)
+            ],
+            batch_size=5000,
+        )
+        Recipie.tags.through.objects.bulk_create(
+            [
+                Recipie.tags.through(recipie_id=recipie.id,tag_id=tags[(i+j)%20].id)
+                for i,recipie in enumerate(recipies) for j in range(3)
+            ],
+            batch_size=5000,
+        )
+        Recipie.ingredients.through.objects.bulk_create(
+            [
+                Recipie.ingredients.through(
+                    recipie_id=recipie.id,
+                    ingredient_id=ingredients[(i+j)%50].id,
+                )
+                for i,recipie in enumerate(recipies) for j in range(5)
+            ],
+            batch_size=5000,
+        )
+        return user
+    
+    def _timed(self,render):
+        started=time.perf_counter()
+        render()
+        return time.perf_counter()-started
+    
+    def _compare(self,user,rows):
+        """Time both renderers over the newest rows recipies"""
+        newest=Recipie.objects.filter(user=user).order_by('-id')
+        cutoff=newest.values_list('id',flat=True)[rows-1]
+        queryset=newest.filter(id__gte=cutoff)
+        prefetched=queryset.only(*RecipieListReader().columns).prefetch_related(
+            Prefetch('tags',queryset=Tag.objects.only('id','name').order_by('id')),
+            Prefetch('ingredients',queryset=Ingredient.objects.only('id','name').order_by('id')),
+        )
+        serializer=self._timed(lambda:RecipieSerializer(prefetched,many=True).data)
+        reader=RecipieListReader()
+        fast=self._timed(lambda:reader.render(reader.values(queryset)))
+        self.stdout.write(
+            f'{rows} rows: serializer {serializer:.3f}s, '
+            f'reader {fast:.3f}s, speedup {serializer/fast:.1f}x'
+        )
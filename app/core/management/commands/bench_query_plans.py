@@ -0,0 +1,89 @@
+"""
+Django command to compare query plans with and without the core indexes
+"""
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand,CommandError
+from django.db import connection,transaction
+from core.management.bench import Rollback
+from core.models import Recipie,Tag,Ingredient
+
+NEW_INDEXES=[
+    'DROP INDEX core_recipie_user_id_desc',
+    'DROP INDEX core_tag_user_name_prefix',
+    'DROP INDEX core_ingr_user_name_prefix',
+    'ALTER TABLE core_tag DROP CONSTRAINT core_tag_unique_user_name',
+    'ALTER TABLE core_ingredient DROP CONSTRAINT core_ingredient_unique_user_name',
+]
+
+class Command(BaseCommand):
+    """Django command to benchmark list and lookup query plans"""
+    help='Seed rows in a rolled back transaction and EXPLAIN the hot queries'
+    
+    def add_arguments(self,parser):
+        parser.add_argument('--rows',type=int,default=1_000_000)
+        parser.add_argument('--users',type=int,default=100)
+        
+    def handle(self,*args,**options):
+        """Entrypoint for command"""
+        if connection.vendor!='postgresql':
+            raise CommandError('Query plan benchmarks need PostgreSQL')
+        try:
+            with transaction.atomic():
+                user=self._seed(options['rows'],options['users'])
+                self._report('With indexes',user)
+                with connection.cursor() as cursor:
+                    for statement in NEW_INDEXES:
+                        cursor.execute(statement)
+                self._report('Without indexes',user)
+                raise Rollback
+        except Rollback:
+            self.stdout.write(self.style.SUCCESS('Benchmark data rolled back'))
+            
+    def _seed(self,rows,users):
+        """Insert rows spread over users and return the user to query for"""
+        started=time.monotonic()
+        owners=get_user_model().objects.bulk_create([
+            get_user_model()(email=f'bench-{i}@example.com',password='!')
+            for i in range(users)
+        ])
+        owner_ids=[owner.id for owner in owners]
+        with connection.cursor() as cursor:
+            for table,columns,values in (
+                (
+                    Recipie._meta.db_table,
+                    'user_id,title,description,time_minutes,price,link,updated_at,image_derivatives',
+                    "(%s::bigint[])[1+i%%%s],'Recipie '||i,'',30,9.99,'',now(),'{}'::jsonb",
+                ),
+                (Tag._meta.db_table,'user_id,name',"(%s::bigint[])[1+i%%%s],'Tag '||i"),
+                (Ingredient._meta.db_table,'user_id,name',"(%s::bigint[])[1+i%%%s],'Ingredient '||i"),
+            ):
+                cursor.execute(
+                    f'INSERT INTO {table} ({columns}) '
+                    f'SELECT {values} FROM generate_series(1,%s) AS i',
+                    [owner_ids,len(owner_ids),rows],
+                )
+                cursor.execute(f'ANALYZE {table}')
+        self.stdout.write(
+            f'Seeded {rows} rows per table for {users} users '
+            f'in {time.monotonic()-started:.1f}s'
+        )
+        return owners[0]
+    
+    def _report(self,title,user):
+        """EXPLAIN ANALYZE the list and lookup queries"""
+        queries={
+            'recipie list':Recipie.objects.filter(user=user).order_by('-id')[:100],
+            'tag list':Tag.objects.filter(user=user).order_by('-name','-id')[:100],
+            'tag lookup':Tag.objects.filter(user=user,name__in=['Tag 100','Tag 200']),
+            'ingredient prefix':Ingredient.objects.filter(
+                user=user,
+                name__startswith='Ingredient 10',
+            )[:20],
+        }
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        for name,queryset in queries.items():
+            plan=queryset.explain(analyze=True)
+            scan='seq scan' if 'Seq Scan' in plan else 'index scan'
+            self.stdout.write(f'{name}: {scan}')
+            self.stdout.write(plan)
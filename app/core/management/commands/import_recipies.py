@@ -0,0 +1,46 @@
+"""
+Django command to import recipies from an NDJSON file
+"""
+import sys
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand,CommandError
+from recipie.importer import RecipieImporter
+
+class Command(BaseCommand):
+    """Django command to import recipies for a user"""
+    help='Import recipies from NDJSON, one recipie per line'
+    
+    def add_arguments(self,parser):
+        parser.add_argument('path',help='NDJSON file to read, or - for stdin')
+        parser.add_argument('--email',required=True,help='Owner of the recipies')
+        parser.add_argument('--chunk-size',type=int,default=1000)
+        
+    def handle(self,*args,**options):
+        """Entrypoint for command"""
+        try:
+            user=get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user with email {options['email']}")
+        importer=RecipieImporter(
+            user,
+            chunk_size=options['chunk_size'],
+            progress=self._report,
+        )
+        if options['path']=='-':
+            stats=importer.run(sys.stdin.buffer)
+        else:
+            with open(options['path'],'rb') as lines:
+                stats=importer.run(lines)
+        for error in stats['errors']:
+            self.stderr.write(f"Line {error['line']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats['imported']} recipies, {stats['failed']} failed, "
+            f"in {stats['seconds']}s ({stats['rate']}/s)"
+        ))
+        
+    def _report(self,stats):
+        """Write progress after each chunk"""
+        self.stdout.write(
+            f"{stats['imported']} imported, {stats['failed']} failed "
+            f"({stats['rate']}/s)"
+        )
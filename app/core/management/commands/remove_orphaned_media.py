@@ -0,0 +1,186 @@
+"""
+Django command to remove uploaded media no recipie references any more
+"""
+import os
+import posixpath
+import re
+import shutil
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+from itertools import islice
+from operator import or_
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+from core.models import Recipie
+
+UPLOADS_DIR='uploads/recipie'
+DERIVED_DIR=f'{UPLOADS_DIR}/derived'
+DIGEST=re.compile(r'^[0-9a-f]{64}$')
+PREFIX=re.compile(r'^[0-9a-f]{2}$')
+
+
+def chunked(iterable,size):
+    """Yield lists of up to size items from iterable"""
+    iterator=iter(iterable)
+    while chunk:=list(islice(iterator,size)):
+        yield chunk
+        
+def source_prefix(stem):
+    """Return the image name prefix of the source of a derivatives directory"""
+    if DIGEST.match(stem):
+        return f'{UPLOADS_DIR}/{stem[:2]}/{stem}.'
+    return f'{UPLOADS_DIR}/{stem}.'
+
+
+class Command(BaseCommand):
+    """Django command to garbage collect recipie images.
+
+    Each directory is scanned lazily with scandir() and checked against
+    the database one chunk at a time, so memory does not grow with the
+    number of files. Directories are scanned in parallel threads.
+    """
+    help='Remove recipie images and derivatives that no recipie references'
+    
+    def add_arguments(self,parser):
+        parser.add_argument(
+            '--grace-hours',type=float,default=24,
+            help='Keep files modified more recently than this',
+        )
+        parser.add_argument('--chunk-size',type=int,default=1000)
+        parser.add_argument('--workers',type=int,default=4)
+        parser.add_argument(
+            '--dry-run',action='store_true',
+            help='Report orphaned files without removing them',
+        )
+        
+    def handle(self,*args,**options):
+        """Entrypoint for command"""
+        self.root=str(settings.MEDIA_ROOT)
+        self.cutoff=time.time()-options['grace_hours']*3600
+        self.chunk_size=options['chunk_size']
+        self.dry_run=options['dry_run']
+        self.report=self.dry_run or options['verbosity']>1
+        self.output_lock=threading.Lock()
+        tasks=list(self._tasks())
+        if options['workers']>1:
+            with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+                results=list(executor.map(self._run,tasks))
+        else:
+            results=[scan(directory) for scan,directory in tasks]
+        stats=sum(results,Counter())
+        verb='Would remove' if self.dry_run else 'Removed'
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {stats['scanned']} files in {len(tasks)} directories. "
+            f"{verb} {stats['removed']} files ({stats['bytes']} bytes)."
+        ))
+        
+    def _tasks(self):
+        """Yield (scan,directory) for every directory to collect"""
+        uploads=os.path.join(self.root,UPLOADS_DIR)
+        if not os.path.isdir(uploads):
+            return
+        yield self._scan_images,UPLOADS_DIR
+        for entry in os.scandir(uploads):
+            if entry.is_dir() and entry.name!='derived':
+                yield self._scan_images,f'{UPLOADS_DIR}/{entry.name}'
+        derived=os.path.join(self.root,DERIVED_DIR)
+        if not os.path.isdir(derived):
+            return
+        for version in os.scandir(derived):
+            if version.is_dir():
+                # Sets of hashed sources sit in prefix directories, others directly
+                directory=f'{DERIVED_DIR}/{version.name}'
+                yield self._scan_derived,directory
+                for entry in os.scandir(version.path):
+                    if entry.is_dir() and PREFIX.match(entry.name):
+                        yield self._scan_derived,f'{directory}/{entry.name}'
+                    
+    def _run(self,task):
+        """Run a scan in a worker thread, with its own database connection"""
+        scan,directory=task
+        try:
+            return scan(directory)
+        finally:
+            connection.close()
+            
+    def _expired(self,entry):
+        return entry.stat().st_mtime<self.cutoff
+    
+    def _remove(self,name,size,stats,files=1):
+        """Remove a file or directory, or only report it in a dry run"""
+        path=os.path.join(self.root,name)
+        try:
+            # A re-upload of the same content touches it before saving its row
+            if os.stat(path).st_mtime>=self.cutoff:
+                return
+        except FileNotFoundError:
+            return
+        stats['removed']+=files
+        stats['bytes']+=size
+        if self.report:
+            with self.output_lock:
+                self.stdout.write(name)
+        if self.dry_run:
+            return
+        if os.path.isdir(path):
+            shutil.rmtree(path,ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            
+    def _scan_images(self,directory):
+        """Remove expired images of directory that no recipie uses"""
+        stats=Counter()
+        
+        def candidates():
+            for entry in os.scandir(os.path.join(self.root,directory)):
+                if entry.is_file():
+                    stats['scanned']+=1
+                    if self._expired(entry):
+                        yield entry
+                        
+        for chunk in chunked(candidates(),self.chunk_size):
+            names={posixpath.join(directory,entry.name):entry for entry in chunk}
+            referenced=set(
+                Recipie.objects.filter(image__in=names).values_list('image',flat=True)
+            )
+            for name,entry in names.items():
+                if name not in referenced:
+                    self._remove(name,entry.stat().st_size,stats)
+        return stats
+    
+    def _scan_derived(self,directory):
+        """Remove expired derivative sets whose source no recipie uses"""
+        stats=Counter()
+        
+        def candidates():
+            for entry in os.scandir(os.path.join(self.root,directory)):
+                if entry.is_dir() and not PREFIX.match(entry.name):
+                    files=[item for item in os.scandir(entry.path) if item.is_file()]
+                    stats['scanned']+=len(files)
+                    if self._expired(entry):
+                        yield entry,files
+                        
+        for chunk in chunked(candidates(),self.chunk_size):
+            prefixes={source_prefix(entry.name):(entry,files) for entry,files in chunk}
+            query=reduce(or_,(Q(image__startswith=prefix) for prefix in prefixes))
+            referenced={
+                name.rsplit('.',1)[0]+'.'
+                for name in Recipie.objects.filter(query).values_list('image',flat=True)
+            }
+            for prefix,(entry,files) in prefixes.items():
+                if prefix not in referenced:
+                    self._remove(
+                        posixpath.join(directory,entry.name),
+                        sum(item.stat().st_size for item in files),
+                        stats,
+                        files=len(files),
+                    )
+        return stats
@@ -1,24 +1,54 @@
 """_summary_
 Django command to wait for the database to be available
  """
-import time 
-from psycopg2 import OperationalError as Psycopg2OpError 
-from django.db.utils import OperationalError
-from typing import Any
-from django.core.management.base import BaseCommand
+import random
+import time
+from django.core.management.base import BaseCommand,CommandError
+from django.db import connections
+from core.health import probe_databases
+
+PROBE_TIMEOUT=5
 
 class Command(BaseCommand):
-    """Django command to wait fo database"""
-    
+    """Django command to wait for the databases.
+
+    Every database is probed with SELECT 1 at once, and the ones still
+    down are retried with exponential backoff and jitter until --timeout.
+    """
+    help='Wait until the databases accept queries'
+
+    def add_arguments(self,parser):
+        parser.add_argument(
+            '--database',action='append',dest='databases',
+            help='Database alias to wait for, repeatable, default all',
+        )
+        parser.add_argument('--timeout',type=float,default=60,help='Seconds to wait in total')
+        parser.add_argument('--initial-delay',type=float,default=0.05)
+        parser.add_argument('--max-delay',type=float,default=0.5)
+
     def handle(self, *args,**options):
         """Entrypoint for command"""
         self.stdout.write('Waiting for database, please be patient')
-        db_up=False
-        while db_up is False:
-            try:
-                self.check(databases=['default'])
-                db_up=True 
-            except (Psycopg2OpError,OperationalError):
-                self.stdout.write('Database unavailable, waiting 1 second...')
-                time.sleep(1)
-        self.stdout.write(self.style.SUCCESS('Database available!!'))
\ No newline at end of file
+        pending=options['databases'] or list(connections)
+        unknown=[alias for alias in pending if alias not in connections]
+        if unknown:
+            raise CommandError(f"Unknown database alias: {', '.join(unknown)}")
+        deadline=time.monotonic()+options['timeout']
+        delay=options['initial_delay']
+        while True:
+            remaining=deadline-time.monotonic()
+            errors=probe_databases(pending,timeout=min(max(remaining,1),PROBE_TIMEOUT))
+            pending=[alias for alias,error in errors.items() if error is not None]
+            if not pending:
+                break
+            remaining=deadline-time.monotonic()
+            if remaining<=0:
+                raise CommandError(
+                    f"Database unavailable after {options['timeout']:g} seconds: "
+                    f"{', '.join(pending)}"
+                )
+            wait=min(random.uniform(delay/2,delay),remaining)
+            self.stdout.write(f"Database unavailable ({', '.join(pending)}), waiting {wait:.2f} seconds...")
+            time.sleep(wait)
+            delay=min(delay*2,options['max_delay'])
+        self.stdout.write(self.style.SUCCESS('Database available!!'))
@@ -0,0 +1,60 @@
+"""Liveness and readiness endpoints answered ahead of other middleware"""
+from asgiref.sync import iscoroutinefunction,markcoroutinefunction,sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse,JsonResponse
+from core.health import probe_databases
+
+HEALTH_PATH='/healthz'
+READY_PATH='/readyz'
+
+
+def readiness():
+    """Return a 200 response when every database answers, otherwise 503"""
+    errors=probe_databases(list(connections),timeout=settings.HEALTH_CHECK_TIMEOUT)
+    databases={alias:'ok' if error is None else 'unavailable' for alias,error in errors.items()}
+    ready=all(error is None for error in errors.values())
+    return JsonResponse(
+        {'status':'ok' if ready else 'unavailable','databases':databases},
+        status=200 if ready else 503,
+    )
+
+
+class HealthCheckMiddleware:
+    """Answer /healthz and /readyz before sessions, auth, CSRF and host checks.
+
+    Keep it first in MIDDLEWARE so probes from the orchestrator, which
+    often use the pod address as host, stay cheap and unauthenticated.
+    Under ASGI it stays async, so requests do not go through a thread.
+    """
+    sync_capable=True
+    async_capable=True
+    
+    def __init__(self,get_response):
+        self.get_response=get_response
+        self.is_async=iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            
+    def __call__(self,request):
+        if self.is_async:
+            return self.__acall__(request)
+        if request.path==HEALTH_PATH:
+            return self.health()
+        if request.path==READY_PATH:
+            return self.no_store(readiness())
+        return self.get_response(request)
+    
+    async def __acall__(self,request):
+        if request.path==HEALTH_PATH:
+            return self.health()
+        if request.path==READY_PATH:
+            return self.no_store(await sync_to_async(readiness)())
+        return await self.get_response(request)
+    
+    def health(self):
+        return self.no_store(HttpResponse('ok',content_type='text/plain'))
+    
+    def no_store(self,response):
+        response['Cache-Control']='no-store'
+        return response
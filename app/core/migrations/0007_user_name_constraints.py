@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:33
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """Merge tags and ingredients sharing a (user, name) before adding the constraint"""
+    Recipie = apps.get_model('core', 'Recipie')
+    for model_name, field_name in (('Tag', 'tags'), ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', model_name)
+        through = Recipie._meta.get_field(field_name).remote_field.through
+        column = through._meta.get_field(model_name.lower()).attname
+        duplicates = (
+            model.objects.values('user_id', 'name')
+            .annotate(keep_id=Min('id'), total=Count('id'))
+            .filter(total__gt=1)
+        )
+        for duplicate in duplicates.iterator():
+            extra_ids = list(
+                model.objects.filter(user_id=duplicate['user_id'], name=duplicate['name'])
+                .exclude(id=duplicate['keep_id'])
+                .values_list('id', flat=True)
+            )
+            recipie_ids = set(
+                through.objects.filter(**{f'{column}__in': extra_ids})
+                .values_list('recipie_id', flat=True)
+            )
+            through.objects.bulk_create(
+                [
+                    through(recipie_id=recipie_id, **{column: duplicate['keep_id']})
+                    for recipie_id in recipie_ids
+                ],
+                ignore_conflicts=True,
+            )
+            model.objects.filter(id__in=extra_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_name_prefix_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipie',
+            index=models.Index(fields=['user', '-id'], name='core_recipie_user_id_desc'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='core_ingredient_unique_user_name'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='core_tag_unique_user_name'),
+        ),
+    ]
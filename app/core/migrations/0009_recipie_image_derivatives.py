@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_recipie_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipie',
+            name='image_derivatives',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:05
+
+import core.models
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_recipie_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipie',
+            name='image',
+            field=models.ImageField(null=True, storage=core.storage.recipie_image_storage, upload_to=core.models.recipie_image_file_path),
+        ),
+    ]
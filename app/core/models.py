@@ -2,6 +2,7 @@ import uuid
 import os
 from django.db import models
 from django.conf import settings 
+from core.storage import recipie_image_storage
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
@@ -51,7 +52,18 @@ class Recipie(models.Model):
     link=models.CharField(max_length=255,blank=True)
     tags=models.ManyToManyField('Tag')
     ingredients=models.ManyToManyField('Ingredient')
-    image=models.ImageField(null=True,upload_to=recipie_image_file_path)
+    image=models.ImageField(
+        null=True,
+        upload_to=recipie_image_file_path,
+        storage=recipie_image_storage,
+    )
+    image_derivatives=models.JSONField(default=dict,blank=True)
+    updated_at=models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes=[
+            models.Index(fields=['user','-id'],name='core_recipie_user_id_desc'),
+        ]
     
     def __str__(self):
         return self.title
@@ -61,6 +73,21 @@ class Tag(models.Model):
     name=models.CharField(max_length=255)
     user=models.ForeignKey(settings.AUTH_USER_MODEL,on_delete=models.CASCADE)
     
+    class Meta:
+        indexes=[
+            models.Index(
+                fields=['user','name'],
+                name='core_tag_user_name_prefix',
+                opclasses=['int8_ops','varchar_pattern_ops'],
+            ),
+        ]
+        constraints=[
+            models.UniqueConstraint(
+                fields=['user','name'],
+                name='core_tag_unique_user_name',
+            ),
+        ]
+    
     def __str__(self):
         return self.name
     
@@ -69,5 +96,20 @@ class Ingredient(models.Model):
     name=models.CharField(max_length=255)
     user=models.ForeignKey(settings.AUTH_USER_MODEL,on_delete=models.CASCADE)
     
+    class Meta:
+        indexes=[
+            models.Index(
+                fields=['user','name'],
+                name='core_ingr_user_name_prefix',
+                opclasses=['int8_ops','varchar_pattern_ops'],
+            ),
+        ]
+        constraints=[
+            models.UniqueConstraint(
+                fields=['user','name'],
+                name='core_ingredient_unique_user_name',
+            ),
+        ]
+    
     def __str__(self):
         return self.name 
\ No newline at end of file
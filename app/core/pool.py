@@ -0,0 +1,43 @@
+"""Database connection pool statistics"""
+from django.db import connections
+
+
+def _stats(pool):
+    stats=pool.get_stats()
+    checkouts=stats.get('requests_num',0)
+    size=stats.get('pool_size',0)
+    available=stats.get('pool_available',0)
+    # A pool opens on first use, until then it counts connections it has not made
+    in_use=0 if pool.closed else size-available
+    return {
+        'open':not pool.closed,
+        'min_size':stats.get('pool_min',pool.min_size),
+        'max_size':stats.get('pool_max',pool.max_size),
+        'size':size,
+        'available':available,
+        'in_use':in_use,
+        'waiting':stats.get('requests_waiting',0),
+        'saturation':in_use/pool.max_size,
+        'checkouts':checkouts,
+        'queued':stats.get('requests_queued',0),
+        'wait_ms':stats.get('requests_wait_ms',0),
+        'avg_wait_ms':stats.get('requests_wait_ms',0)/checkouts if checkouts else 0,
+        'timeouts':stats.get('requests_errors',0),
+        'usage_ms':stats.get('usage_ms',0),
+        'connections':stats.get('connections_num',0),
+        'connection_errors':stats.get('connections_errors',0),
+        'connections_lost':stats.get('connections_lost',0),
+        'returned_bad':stats.get('returns_bad',0),
+    }
+
+def pool_stats():
+    """Return the pool statistics of each pooled database alias.
+
+    Counters are per process and count from when the pool was opened.
+    """
+    result={}
+    for alias in connections:
+        pool=getattr(connections[alias],'pool',None)
+        if pool is not None:
+            result[alias]=_stats(pool)
+    return result
@@ -0,0 +1,74 @@
+"""Content-addressed storage for recipie images"""
+import hashlib
+import os
+import posixpath
+import re
+import uuid
+from django.core.files.storage import FileSystemStorage
+
+# A content hash as a file name or as the directory of derived files
+HASHED_NAME=re.compile(r'(^|/)[0-9a-f]{64}(\.\w+)?(/|$)')
+
+
+def is_content_addressed(name):
+    """Return True if name is a content hash, so its bytes never change"""
+    return bool(HASHED_NAME.search(name))
+
+def content_addressed_tail(name):
+    """Return the part of name from its content hash on, or None"""
+    match=HASHED_NAME.search(name)
+    return name[match.start():].lstrip('/') if match else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Store files under the SHA-256 of their content, once per content.
+
+    Uploading bytes that are already stored returns the existing name,
+    so any number of recipies share one file. Deleting is left to the
+    orphaned media collector, which removes files no row references any
+    more, because a shared file cannot be deleted on behalf of one row.
+    """
+    
+    def _digest(self,content):
+        digest=hashlib.sha256()
+        if hasattr(content,'seek'):
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content,'seek'):
+            content.seek(0)
+        return digest.hexdigest()
+    
+    def save(self,name,content,max_length=None):
+        digest=self._digest(content)
+        ext=os.path.splitext(name)[1].lower()
+        name=posixpath.join(posixpath.dirname(name),digest[:2],f'{digest}{ext}')
+        if self.exists(name):
+            # Restart the orphan collector's grace period for the new reference
+            os.utime(self.path(name))
+            return name
+        return super().save(name,content,max_length)
+    
+    def _save(self,name,content):
+        """Write aside, then link into place unless a concurrent save won.
+
+        The stored name must stay the hash, so an upload of the same bytes
+        that got there first counts as success instead of being renamed.
+        """
+        tmp=super()._save(posixpath.join(posixpath.dirname(name),f'.{uuid.uuid4().hex}.part'),content)
+        full_path=self.path(name)
+        try:
+            os.link(self.path(tmp),full_path)
+        except FileExistsError:
+            os.utime(full_path)
+        finally:
+            os.remove(self.path(tmp))
+        return name
+    
+    def delete(self,name):
+        """Keep the file, it may be shared with other rows"""
+        
+        
+def recipie_image_storage():
+    """Return the storage of recipie images"""
+    return ContentAddressedStorage()
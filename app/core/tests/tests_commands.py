@@ -1,27 +1,209 @@
 """_summary_
     TEST CUSTOM DJANGO COMMANDS
 """
+import json
+import os
+import tempfile
+import time
+from io import StringIO
+from unittest import skipUnless
 from unittest.mock import patch
-from psycopg2 import OperationalError as Psycopg2Error 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase,TestCase
+from django.test.utils import CaptureQueriesContext
+from core.models import Recipie,Tag
 
-@patch("core.management.commands.wait_for_db.Command.check")
+@patch("core.management.commands.wait_for_db.probe_databases")
 class CommandTest(SimpleTestCase):
     """Test commands"""
-    def test_wait_for_db_ready(self,patched_check):
+    def test_wait_for_db_ready(self,patched_probe):
         """Test waiting for database if database is ready"""
-        patched_check.return_value=True
-        call_command('wait_for_db')
-        patched_check.assert_called_once_with(databases=['default'])
+        patched_probe.return_value={'default':None}
+        call_command('wait_for_db',stdout=StringIO())
+        patched_probe.assert_called_once()
+        self.assertEqual(patched_probe.call_args.args[0],['default'])
         
     @patch('time.sleep')
-    def test_wait_for_db_delay(self,patched_sleep,patched_check):
+    def test_wait_for_db_delay(self,patched_sleep,patched_probe):
         """Test waiting for database when getting OperationalError"""
-        patched_check.side_effect=[Psycopg2Error]*2 + \
-            [OperationalError]*3 + [True]
-        call_command('wait_for_db')
-        self.assertEqual(patched_check.call_count,6)
-        patched_check.assert_called_with(databases=['default'])
-        
\ No newline at end of file
+        patched_probe.side_effect=[{'default':OperationalError()}]*5+[{'default':None}]
+        call_command('wait_for_db',stdout=StringIO())
+        self.assertEqual(patched_probe.call_count,6)
+        delays=[call.args[0] for call in patched_sleep.call_args_list]
+        self.assertEqual(len(delays),5)
+        self.assertTrue(all(delay<=0.5 for delay in delays))
+        self.assertLess(delays[0],delays[-1])
+        
+    @patch('core.management.commands.wait_for_db.connections',{'default':None,'replica':None})
+    @patch('time.sleep')
+    def test_wait_for_db_retries_unavailable_only(self,patched_sleep,patched_probe):
+        """Test only the databases still down are probed again"""
+        patched_probe.side_effect=[
+            {'default':None,'replica':OperationalError()},
+            {'replica':None},
+        ]
+        call_command('wait_for_db','--database','default','--database','replica',stdout=StringIO())
+        self.assertEqual(patched_probe.call_args_list[0].args[0],['default','replica'])
+        self.assertEqual(patched_probe.call_args_list[1].args[0],['replica'])
+        
+    def test_wait_for_db_unknown_alias(self,patched_probe):
+        """Test an unknown database alias is rejected before probing"""
+        with self.assertRaisesMessage(CommandError,'Unknown database alias: missing'):
+            call_command('wait_for_db','--database','missing',stdout=StringIO())
+        patched_probe.assert_not_called()
+        
+    def test_wait_for_db_timeout(self,patched_probe):
+        """Test the command fails once the timeout has passed"""
+        patched_probe.return_value={'default':OperationalError()}
+        with self.assertRaisesMessage(CommandError,'default'):
+            call_command('wait_for_db','--timeout','0',stdout=StringIO())
+            
+class ImportRecipiesCommandTest(TestCase):
+    """Test the import_recipies command"""
+    def test_import_recipies_from_file(self):
+        """Test recipies are imported in chunks for the given user"""
+        user=get_user_model().objects.create_user('user@example.com','testpass123')
+        with tempfile.NamedTemporaryFile('w',suffix='.ndjson') as ndjson:
+            for i in range(5):
+                ndjson.write(json.dumps({
+                    'title':f'Recipie {i}',
+                    'time_minutes':i+1,
+                    'price':'2.00',
+                    'tags':[{'name':'Imported'}],
+                })+'\n')
+            ndjson.flush()
+            out=StringIO()
+            call_command(
+                'import_recipies',
+                ndjson.name,
+                email=user.email,
+                chunk_size=2,
+                stdout=out,
+            )
+        self.assertEqual(Recipie.objects.filter(user=user).count(),5)
+        self.assertEqual(Tag.objects.filter(user=user).count(),1)
+        self.assertIn('Imported 5 recipies',out.getvalue())
+        
+    def test_import_recipies_unknown_user(self):
+        """Test importing for a missing user fails"""
+        with self.assertRaises(CommandError):
+            call_command('import_recipies','-',email='nobody@example.com')
+            
+@skipUnless(connection.vendor=='postgresql','Query plans need PostgreSQL')
+class BenchQueryPlansCommandTest(TestCase):
+    """Test the bench_query_plans command"""
+    def test_bench_query_plans_rolls_back(self):
+        """Test the benchmark reports plans and leaves no rows behind"""
+        out=StringIO()
+        call_command('bench_query_plans',rows=200,users=2,stdout=out)
+        self.assertIn('recipie list',out.getvalue())
+        self.assertFalse(Recipie.objects.exists())
+        
+class BenchListSerializerCommandTest(TestCase):
+    """Test the bench_list_serializer command"""
+    def test_bench_list_serializer_rolls_back(self):
+        """Test the benchmark reports each size and leaves no rows behind"""
+        out=StringIO()
+        call_command('bench_list_serializer',rows=[5,10],stdout=out)
+        self.assertIn('5 rows: serializer',out.getvalue())
+        self.assertIn('10 rows: serializer',out.getvalue())
+        self.assertFalse(Recipie.objects.exists())
+        
+        
+class RemoveOrphanedMediaCommandTest(TestCase):
+    """Test the remove_orphaned_media command"""
+    def setUp(self):
+        self.root=tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        override=self.settings(MEDIA_ROOT=self.root.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user=get_user_model().objects.create_user('user@example.com','testpass123')
+        self.used='ab'*32
+        self.orphan='cd'*32
+        self.write(f'uploads/recipie/ab/{self.used}.jpg')
+        self.write(f'uploads/recipie/cd/{self.orphan}.jpg')
+        self.write('uploads/recipie/legacy.jpg')
+        self.write(f'uploads/recipie/derived/v1/ab/{self.used}/thumb.jpg')
+        self.write(f'uploads/recipie/derived/v1/cd/{self.orphan}/thumb.jpg')
+        self.write(f'uploads/recipie/derived/v1/cd/{self.orphan}/thumb.webp')
+        Recipie.objects.create(
+            user=self.user,title='Used',time_minutes=1,price='1.00',
+            image=f'uploads/recipie/ab/{self.used}.jpg',
+        )
+        
+    def write(self,name,age=48*3600):
+        """Write a media file last modified age seconds ago"""
+        path=os.path.join(self.root.name,name)
+        os.makedirs(os.path.dirname(path),exist_ok=True)
+        with open(path,'wb') as f:
+            f.write(b'x'*10)
+        mtime=time.time()-age
+        os.utime(path,(mtime,mtime))
+        os.utime(os.path.dirname(path),(mtime,mtime))
+        
+    def exists(self,name):
+        return os.path.exists(os.path.join(self.root.name,name))
+    
+    def test_dry_run_reports_without_removing(self):
+        """Test a dry run lists orphans and keeps every file"""
+        out=StringIO()
+        call_command('remove_orphaned_media',dry_run=True,workers=1,stdout=out)
+        
+        output=out.getvalue()
+        self.assertIn(f'uploads/recipie/cd/{self.orphan}.jpg',output)
+        self.assertIn('uploads/recipie/legacy.jpg',output)
+        self.assertIn(f'uploads/recipie/derived/v1/cd/{self.orphan}',output)
+        self.assertNotIn(self.used,output.replace('Scanned',''))
+        self.assertIn('Would remove 4 files (40 bytes)',output)
+        self.assertTrue(self.exists(f'uploads/recipie/cd/{self.orphan}.jpg'))
+        
+    def test_removes_orphans_in_chunks(self):
+        """Test unreferenced files and derivatives are removed"""
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('remove_orphaned_media',workers=1,chunk_size=1,stdout=StringIO())
+            
+        self.assertTrue(self.exists(f'uploads/recipie/ab/{self.used}.jpg'))
+        self.assertTrue(self.exists(f'uploads/recipie/derived/v1/ab/{self.used}/thumb.jpg'))
+        self.assertFalse(self.exists(f'uploads/recipie/cd/{self.orphan}.jpg'))
+        self.assertFalse(self.exists('uploads/recipie/legacy.jpg'))
+        self.assertFalse(self.exists(f'uploads/recipie/derived/v1/cd/{self.orphan}'))
+        self.assertEqual(len(ctx.captured_queries),5)
+        
+    def test_sets_outside_prefix_directories(self):
+        """Test derivative sets stored directly in the version are collected"""
+        self.write('uploads/recipie/derived/v1/legacy/thumb.jpg')
+        self.write(f'uploads/recipie/derived/v1/{self.used}/thumb.jpg')
+        out=StringIO()
+        call_command('remove_orphaned_media',workers=1,stdout=out)
+        
+        self.assertFalse(self.exists('uploads/recipie/derived/v1/legacy'))
+        self.assertTrue(self.exists(f'uploads/recipie/derived/v1/{self.used}/thumb.jpg'))
+        self.assertIn('in 6 directories',out.getvalue())
+        
+    def test_touched_since_scan_is_kept(self):
+        """Test a file re-uploaded after the scan judged it expired is kept"""
+        self.write('uploads/recipie/fresh.jpg',age=60)
+        with patch('core.management.commands.remove_orphaned_media.Command._expired',return_value=True):
+            call_command('remove_orphaned_media',workers=1,stdout=StringIO())
+        self.assertTrue(self.exists('uploads/recipie/fresh.jpg'))
+        self.assertFalse(self.exists('uploads/recipie/legacy.jpg'))
+        
+    def test_grace_period_keeps_new_files(self):
+        """Test files newer than the grace period are kept"""
+        self.write('uploads/recipie/fresh.jpg',age=60)
+        call_command('remove_orphaned_media',workers=1,stdout=StringIO())
+        self.assertTrue(self.exists('uploads/recipie/fresh.jpg'))
+        self.assertFalse(self.exists('uploads/recipie/legacy.jpg'))
+        
+    def test_missing_media_root(self):
+        """Test an empty media root is not an error"""
+        out=StringIO()
+        with self.settings(MEDIA_ROOT=os.path.join(self.root.name,'missing')):
+            call_command('remove_orphaned_media',stdout=out)
+        self.assertIn('Removed 0 files',out.getvalue())
+
@@ -0,0 +1,73 @@
+"""Tests for the database probes and health endpoints"""
+from unittest.mock import patch
+from asgiref.sync import SyncToAsync
+from django.core.handlers.asgi import ASGIHandler
+from django.db import OperationalError
+from django.test import SimpleTestCase,TestCase
+from core.health import probe_databases
+
+
+class ProbeDatabasesTest(TestCase):
+    """Test probing the configured databases"""
+    def test_probe_available_database(self):
+        """Test an available database reports no error"""
+        self.assertEqual(probe_databases(['default']),{'default':None})
+        
+    @patch('core.health.probe_database')
+    def test_probe_collects_errors(self,patched_probe):
+        """Test each database reports its own error"""
+        error=OperationalError('down')
+        def probe(alias,timeout):
+            if alias=='replica':
+                raise error
+        patched_probe.side_effect=probe
+        
+        self.assertEqual(
+            probe_databases(['default','replica']),
+            {'default':None,'replica':error},
+        )
+        
+        
+class HealthEndpointsTest(SimpleTestCase):
+    """Test /healthz and /readyz"""
+    def test_healthz(self):
+        """Test liveness answers without touching the database"""
+        with patch('core.middleware.probe_databases') as patched_probe:
+            res=self.client.get('/healthz',HTTP_HOST='10.0.0.7')
+        self.assertEqual(res.status_code,200)
+        self.assertEqual(res.content,b'ok')
+        self.assertEqual(res['Cache-Control'],'no-store')
+        patched_probe.assert_not_called()
+        
+    @patch('core.middleware.probe_databases',return_value={'default':None})
+    def test_readyz_ready(self,patched_probe):
+        """Test readiness is 200 when every database answers"""
+        res=self.client.get('/readyz')
+        self.assertEqual(res.status_code,200)
+        self.assertEqual(res.json(),{'status':'ok','databases':{'default':'ok'}})
+        
+    @patch('core.middleware.probe_databases',return_value={'default':OperationalError('down')})
+    def test_readyz_unavailable(self,patched_probe):
+        """Test readiness is 503 when a database is down"""
+        res=self.client.get('/readyz')
+        self.assertEqual(res.status_code,503)
+        self.assertEqual(res.json()['databases'],{'default':'unavailable'})
+        
+    def test_skips_other_middleware(self):
+        """Test probes get no session or CSRF handling"""
+        with patch('core.middleware.probe_databases',return_value={'default':None}):
+            res=self.client.post('/readyz')
+        self.assertEqual(res.status_code,200)
+        self.assertNotIn('Set-Cookie',res)
+        
+    async def test_readyz_async(self):
+        """Test the probes answer through the async middleware chain"""
+        with patch('core.middleware.probe_databases',return_value={'default':None}):
+            res=await self.async_client.get('/readyz')
+        self.assertEqual(res.status_code,200)
+        res=await self.async_client.get('/healthz')
+        self.assertEqual(res.content,b'ok')
+        
+    def test_asgi_chain_stays_async(self):
+        """Test the middleware does not push ASGI requests into a thread"""
+        self.assertNotIsInstance(ASGIHandler()._middleware_chain,SyncToAsync)
@@ -0,0 +1,62 @@
+"""Tests for database connection pool statistics"""
+from types import SimpleNamespace
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from psycopg_pool import ConnectionPool
+from core.pool import pool_stats
+
+POOL_STATS_URL=reverse('db-pool-stats')
+
+
+class PoolStatsTest(TestCase):
+    """Test pool statistics and their endpoint"""
+    def setUp(self):
+        self.pool=ConnectionPool('',open=False,min_size=2,max_size=4)
+        self.connections={
+            'default':SimpleNamespace(pool=self.pool),
+            'other':SimpleNamespace(),
+        }
+    
+    def test_pool_stats(self):
+        """Test stats are reported for pooled aliases only"""
+        self.pool._stats.update(requests_num=4,requests_wait_ms=10)
+        with patch('core.pool.connections',self.connections),\
+                patch.object(self.pool,'_get_measures',return_value={
+                    'pool_min':2,'pool_max':4,'pool_size':3,
+                    'pool_available':1,'requests_waiting':0,
+                }):
+            with patch.object(ConnectionPool,'closed',False):
+                stats=pool_stats()
+        
+        self.assertEqual(list(stats),['default'])
+        self.assertEqual(stats['default']['max_size'],4)
+        self.assertEqual(stats['default']['checkouts'],4)
+        self.assertEqual(stats['default']['avg_wait_ms'],2.5)
+        self.assertEqual(stats['default']['saturation'],0.5)
+    
+    def test_unused_pool(self):
+        """Test a pool with no checkouts reports zeros"""
+        with patch('core.pool.connections',self.connections):
+            stats=pool_stats()['default']
+        
+        self.assertFalse(stats['open'])
+        self.assertEqual(stats['checkouts'],0)
+        self.assertEqual(stats['avg_wait_ms'],0)
+        self.assertEqual(stats['saturation'],0)
+    
+    def test_endpoint_requires_staff(self):
+        """Test only staff can read pool statistics"""
+        user=get_user_model().objects.create_user('user@example.com','test123')
+        self.client.force_login(user)
+        res=self.client.get(POOL_STATS_URL)
+        self.assertEqual(res.status_code,302)
+        
+        user.is_staff=True
+        user.save()
+        with patch('core.pool.connections',self.connections):
+            res=self.client.get(POOL_STATS_URL)
+        self.assertEqual(res.status_code,200)
+        self.assertIn('pid',res.json())
+        self.assertEqual(res.json()['databases']['default']['max_size'],4)
@@ -0,0 +1,52 @@
+"""Tests for content-addressed image storage"""
+import hashlib
+import os
+import tempfile
+from unittest.mock import patch
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+from core.storage import ContentAddressedStorage,is_content_addressed
+
+class ContentAddressedStorageTest(SimpleTestCase):
+    """Test storing files by their content hash"""
+    def setUp(self):
+        self.location=tempfile.TemporaryDirectory()
+        self.addCleanup(self.location.cleanup)
+        self.storage=ContentAddressedStorage(location=self.location.name)
+        
+    def test_name_is_content_hash(self):
+        """Test files are named by the SHA-256 of their bytes"""
+        digest=hashlib.sha256(b'image').hexdigest()
+        
+        name=self.storage.save('uploads/recipie/abc.JPG',ContentFile(b'image'))
+        
+        self.assertEqual(name,f'uploads/recipie/{digest[:2]}/{digest}.jpg')
+        self.assertTrue(is_content_addressed(name))
+        self.assertFalse(is_content_addressed('uploads/recipie/abc.jpg'))
+        
+    def test_same_content_stored_once(self):
+        """Test saving the same bytes again reuses the file"""
+        first=self.storage.save('uploads/recipie/a.jpg',ContentFile(b'image'))
+        second=self.storage.save('uploads/recipie/b.jpg',ContentFile(b'image'))
+        other=self.storage.save('uploads/recipie/c.jpg',ContentFile(b'other'))
+        
+        self.assertEqual(first,second)
+        self.assertNotEqual(first,other)
+        files=[name for _,_,names in os.walk(self.location.name) for name in names]
+        self.assertEqual(len(files),2)
+        
+    def test_concurrent_save_keeps_hash_name(self):
+        """Test losing a race to the same bytes reuses the stored file"""
+        first=self.storage.save('uploads/recipie/a.jpg',ContentFile(b'image'))
+        with patch.object(self.storage,'exists',return_value=False):
+            second=self.storage.save('uploads/recipie/b.jpg',ContentFile(b'image'))
+            
+        self.assertEqual(first,second)
+        files=[name for _,_,names in os.walk(self.location.name) for name in names]
+        self.assertEqual(files,[os.path.basename(first)])
+        
+    def test_delete_keeps_shared_file(self):
+        """Test deleting leaves the file to the orphan collector"""
+        name=self.storage.save('uploads/recipie/a.jpg',ContentFile(b'image'))
+        self.storage.delete(name)
+        self.assertTrue(self.storage.exists(name))
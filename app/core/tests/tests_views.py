@@ -0,0 +1,122 @@
+"""Tests for serving media files"""
+import os
+import tempfile
+from django.test import SimpleTestCase,override_settings
+from django.urls import reverse
+from django.utils.http import http_date
+
+HASHED='uploads/recipie/ab/'+'ab'*32+'.jpg'
+PLAIN='uploads/recipie/plain.jpg'
+
+def media_url(path):
+    return reverse('media',args=[path])
+
+class ServeMediaTest(SimpleTestCase):
+    """Test the media view"""
+    def setUp(self):
+        self.root=tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        override=override_settings(MEDIA_ROOT=self.root.name,MEDIA_SENDFILE='')
+        override.enable()
+        self.addCleanup(override.disable)
+        for path in (HASHED,PLAIN):
+            os.makedirs(os.path.join(self.root.name,os.path.dirname(path)),exist_ok=True)
+            with open(os.path.join(self.root.name,path),'wb') as f:
+                f.write(bytes(range(100)))
+                
+    def test_serves_file_with_validators(self):
+        """Test files are streamed with ETag and Last-Modified"""
+        res=self.client.get(media_url(PLAIN))
+        
+        self.assertEqual(res.status_code,200)
+        self.assertEqual(b''.join(res.streaming_content),bytes(range(100)))
+        self.assertEqual(res['Content-Length'],'100')
+        self.assertEqual(res['Content-Type'],'image/jpeg')
+        self.assertEqual(res['Accept-Ranges'],'bytes')
+        self.assertIn('ETag',res)
+        self.assertIn('Last-Modified',res)
+        
+    def test_cache_control(self):
+        """Test hashed names are immutable and others revalidate"""
+        res=self.client.get(media_url(HASHED))
+        self.assertIn('immutable',res['Cache-Control'])
+        self.assertIn('max-age=31536000',res['Cache-Control'])
+        
+        res=self.client.get(media_url(PLAIN))
+        self.assertNotIn('immutable',res['Cache-Control'])
+        self.assertIn('max-age=3600',res['Cache-Control'])
+        
+    def test_conditional_requests(self):
+        """Test If-None-Match and If-Modified-Since return 304"""
+        res=self.client.get(media_url(HASHED))
+        
+        cached=self.client.get(media_url(HASHED),HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(cached.status_code,304)
+        self.assertEqual(cached['ETag'],res['ETag'])
+        res=self.client.get(media_url(PLAIN))
+        cached=self.client.get(media_url(PLAIN),HTTP_IF_MODIFIED_SINCE=res['Last-Modified'])
+        self.assertEqual(cached.status_code,304)
+        
+    def test_hashed_validators_ignore_mtime(self):
+        """Test hashed files keep their ETag when a re-upload touches them"""
+        res=self.client.get(media_url(HASHED))
+        self.assertEqual(res['ETag'],'"'+'ab'*32+'.jpg"')
+        self.assertNotIn('Last-Modified',res)
+        
+        os.utime(os.path.join(self.root.name,HASHED),(1,1))
+        cached=self.client.get(media_url(HASHED),HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(cached.status_code,304)
+        
+    def test_range_requests(self):
+        """Test single byte ranges, suffix ranges and unsatisfiable ranges"""
+        res=self.client.get(media_url(HASHED),HTTP_RANGE='bytes=10-19')
+        self.assertEqual(res.status_code,206)
+        self.assertEqual(b''.join(res.streaming_content),bytes(range(10,20)))
+        self.assertEqual(res['Content-Range'],'bytes 10-19/100')
+        self.assertEqual(res['Content-Length'],'10')
+        
+        res=self.client.get(media_url(HASHED),HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(res.streaming_content),bytes(range(95,100)))
+        
+        res=self.client.get(media_url(HASHED),HTTP_RANGE='bytes=200-')
+        self.assertEqual(res.status_code,416)
+        self.assertEqual(res['Content-Range'],'bytes */100')
+        
+    def test_if_range_mismatch_sends_whole_file(self):
+        """Test a stale If-Range validator gets the full file"""
+        res=self.client.get(
+            media_url(HASHED),
+            HTTP_RANGE='bytes=0-9',
+            HTTP_IF_RANGE='"stale"',
+        )
+        self.assertEqual(res.status_code,200)
+        
+        res=self.client.get(
+            media_url(PLAIN),
+            HTTP_RANGE='bytes=0-9',
+            HTTP_IF_RANGE=http_date(os.stat(os.path.join(self.root.name,PLAIN)).st_mtime),
+        )
+        self.assertEqual(res.status_code,206)
+        
+    def test_offload_to_front_end(self):
+        """Test X-Accel-Redirect and X-Sendfile leave the body to the server"""
+        with self.settings(MEDIA_SENDFILE='x-accel-redirect'):
+            res=self.client.get(media_url(HASHED))
+        self.assertEqual(res['X-Accel-Redirect'],'/protected-media/'+HASHED)
+        self.assertEqual(res.content,b'')
+        self.assertIn('immutable',res['Cache-Control'])
+        
+        with self.settings(MEDIA_SENDFILE='x-sendfile'):
+            res=self.client.get(media_url(HASHED))
+        self.assertEqual(res['X-Sendfile'],os.path.join(self.root.name,HASHED))
+        
+    def test_missing_and_outside_paths(self):
+        """Test missing files, directories and traversal return 404"""
+        for path in ('uploads/missing.jpg','uploads','../etc/passwd'):
+            res=self.client.get(media_url(path))
+            self.assertEqual(res.status_code,404)
+            
+    def test_write_methods_not_allowed(self):
+        """Test only GET and HEAD are served"""
+        res=self.client.post(media_url(HASHED))
+        self.assertEqual(res.status_code,405)
@@ -1,3 +1,147 @@
-from django.shortcuts import render
+"""Serving uploaded media files and database pool statistics"""
+import mimetypes
+import os
+import re
+import stat
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse,Http404,HttpResponse,JsonResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response,patch_cache_control
+from django.utils.http import http_date,parse_http_date_safe
+from django.views.decorators.http import require_safe
+from core.pool import pool_stats
+from core.storage import content_addressed_tail
 
-# Create your views here.
+RANGE=re.compile(r'^bytes=(\d*)-(\d*)$')
+IMMUTABLE_MAX_AGE=365*24*60*60
+
+
+class FileRange:
+    """Read at most length bytes of a file from start"""
+    
+    def __init__(self,file,start,length):
+        file.seek(start)
+        self.file=file
+        self.remaining=length
+        
+    def read(self,size=-1):
+        if size<0 or size>self.remaining:
+            size=self.remaining
+        data=self.file.read(size)
+        self.remaining-=len(data)
+        return data
+    
+    def close(self):
+        self.file.close()
+        
+        
+def parse_range(header,size):
+    """Return (start,end) of a single byte range, or None to send it all.
+
+    Raises ValueError if the range cannot be satisfied.
+    """
+    match=RANGE.match(header.strip())
+    if not match:
+        return None
+    first,last=match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start,end=max(size-int(last),0),size-1
+    else:
+        start=int(first)
+        end=min(int(last),size-1) if last else size-1
+    if start>end or start>=size:
+        raise ValueError(header)
+    return start,end
+
+def _range_applies(request,etag,last_modified):
+    """Return True unless If-Range names another version of the file"""
+    if_range=request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range==etag
+    return last_modified is not None and parse_http_date_safe(if_range)==last_modified
+
+def _offload(path,headers):
+    """Hand the transfer of path to the front-end web server"""
+    mode=settings.MEDIA_SENDFILE
+    response=HttpResponse(headers=headers)
+    if mode=='x-accel-redirect':
+        relative=os.path.relpath(path,settings.MEDIA_ROOT)
+        response['X-Accel-Redirect']=settings.MEDIA_ACCEL_PREFIX+relative.replace(os.sep,'/')
+    else:
+        response['X-Sendfile']=path
+    del response['Content-Type']
+    return response
+
+@require_safe
+def serve_media(request,path):
+    """Serve a file under MEDIA_ROOT with validators, ranges and caching.
+
+    Whole files go out as a FileResponse, which WSGI servers transfer
+    with sendfile(). With MEDIA_SENDFILE set, the front-end server sends
+    the file instead, after the checks here.
+    """
+    try:
+        full_path=safe_join(settings.MEDIA_ROOT,path)
+        st=os.stat(full_path)
+    except (SuspiciousFileOperation,OSError):
+        raise Http404
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404
+    tail=content_addressed_tail(path)
+    if tail:
+        # The name is the content, and the mtime moves on every re-upload
+        etag,last_modified=f'"{tail}"',None
+    else:
+        etag,last_modified=f'"{st.st_mtime_ns:x}-{st.st_size:x}"',int(st.st_mtime)
+    response=get_conditional_response(request,etag=etag,last_modified=last_modified)
+    if response is None and settings.MEDIA_SENDFILE:
+        response=_offload(full_path,{})
+    elif response is None:
+        response=_file_response(request,full_path,st,etag,last_modified)
+    response['ETag']=etag
+    if last_modified is not None:
+        response['Last-Modified']=http_date(last_modified)
+    if tail:
+        patch_cache_control(response,public=True,max_age=IMMUTABLE_MAX_AGE,immutable=True)
+    else:
+        patch_cache_control(response,public=True,max_age=settings.MEDIA_MAX_AGE)
+    return response
+
+def _file_response(request,full_path,st,etag,last_modified):
+    """Return the whole file, or the byte range the request asked for"""
+    byte_range=None
+    header=request.META.get('HTTP_RANGE')
+    if header and _range_applies(request,etag,last_modified):
+        try:
+            byte_range=parse_range(header,st.st_size)
+        except ValueError:
+            response=HttpResponse(status=416)
+            response['Content-Range']=f'bytes */{st.st_size}'
+            return response
+    file=open(full_path,'rb')
+    if byte_range is None:
+        response=FileResponse(file)
+    else:
+        start,end=byte_range
+        content_type=mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+        response=FileResponse(
+            FileRange(file,start,end-start+1),
+            status=206,
+            content_type=content_type,
+        )
+        response['Content-Length']=end-start+1
+        response['Content-Range']=f'bytes {start}-{end}/{st.st_size}'
+    response['Accept-Ranges']='bytes'
+    return response
+
+@require_safe
+@staff_member_required
+def db_pool_stats(request):
+    """Return the connection pool statistics of this worker process"""
+    return JsonResponse({'pid':os.getpid(),'databases':pool_stats()})
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RecipieConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipie'
+
+    def ready(self):
+        from recipie import signals  # noqa: F401
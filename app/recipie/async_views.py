@@ -0,0 +1,124 @@
+"""Natively async list and retrieve for recipie APIs under ASGI"""
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404,HttpResponse
+from django.urls import URLPattern
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.routers import DefaultRouter
+
+ASYNC_ACTIONS=('list','retrieve')
+
+
+class AsyncReadMixin:
+    """Async twins of list and retrieve, using the async ORM.
+    
+    They build the same querysets and serializers as the sync actions,
+    so the output matches, but rows are fetched with aiterator() and
+    aget() instead of blocking a worker thread for the whole request.
+    """
+    async_chunk_size=2000
+    
+    def async_supported(self):
+        """Return False to serve this request with the sync action"""
+        return True
+    
+    async def afetch(self,queryset):
+        """Return the rows of queryset, prefetching with the async ORM"""
+        return [obj async for obj in queryset.aiterator(chunk_size=self.async_chunk_size)]
+    
+    async def aget_object(self):
+        """Async get_object"""
+        queryset=self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg=self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj=await queryset.aget(**{self.lookup_field:self.kwargs[lookup_url_kwarg]})
+        except queryset.model.DoesNotExist:
+            raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+        except (TypeError,ValueError,ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request,obj)
+        return obj
+    
+    async def alist(self,request,*args,**kwargs):
+        queryset=self.filter_queryset(self.get_queryset())
+        if self.paginator is not None:
+            page=await self.paginator.apaginate_queryset(queryset,request,view=self)
+            if page is not None:
+                serializer=self.get_serializer(page,many=True)
+                return self.get_paginated_response(serializer.data)
+        serializer=self.get_serializer(await self.afetch(queryset),many=True)
+        return Response(serializer.data)
+    
+    async def aretrieve(self,request,*args,**kwargs):
+        instance=await self.aget_object()
+        return Response(self.get_serializer(instance).data)
+
+
+async def aauthenticate(request):
+    """Run DRF's authentication of request without blocking the loop"""
+    await sync_to_async(lambda:request.user)()
+
+def async_read_view(sync_view):
+    """Wrap a viewset view so GET list and retrieve run natively async.
+    
+    Other methods, and requests the async actions do not cover (such as
+    the browsable API), are passed to the sync view.
+    """
+    viewset=sync_view.cls
+    actions=sync_view.actions
+    initkwargs=sync_view.initkwargs
+    
+    async def view(request,*args,**kwargs):
+        action=actions.get(request.method.lower())
+        self=viewset(**initkwargs)
+        self.action=action
+        self.action_map=actions
+        self.args,self.kwargs=args,kwargs
+        self.request=request
+        if action not in ASYNC_ACTIONS or not self.async_supported():
+            return await sync_to_async(sync_view)(request,*args,**kwargs)
+        request=self.initialize_request(request,*args,**kwargs)
+        self.request=request
+        self.headers=self.default_response_headers
+        try:
+            self.format_kwarg=self.get_format_suffix(**kwargs)
+            request.accepted_renderer,request.accepted_media_type=\
+                self.perform_content_negotiation(request)
+            if not isinstance(request.accepted_renderer,JSONRenderer):
+                return await sync_to_async(sync_view)(request._request,*args,**kwargs)
+            await aauthenticate(request)
+            self.initial(request,*args,**kwargs)
+            response=await getattr(self,f'a{action}')(request,*args,**kwargs)
+        except Exception as exc:
+            response=self.handle_exception(exc)
+        response=self.finalize_response(request,response,*args,**kwargs)
+        if not isinstance(response,Response):
+            return response
+        response.render()
+        # A plain response, so Django does not render it again in a thread
+        return HttpResponse(
+            response.content,
+            status=response.status_code,
+            headers=response.headers,
+        )
+    
+    view.cls=viewset
+    view.initkwargs=initkwargs
+    view.actions=actions
+    return csrf_exempt(view)
+
+
+class AsyncReadRouter(DefaultRouter):
+    """DefaultRouter serving GET list and retrieve of AsyncReadMixin viewsets async"""
+    
+    def get_urls(self):
+        urls=[]
+        for url in super().get_urls():
+            cls=getattr(url.callback,'cls',None)
+            actions=getattr(url.callback,'actions',None) or {}
+            if cls and issubclass(cls,AsyncReadMixin) and actions.get('get') in ASYNC_ACTIONS:
+                url=URLPattern(url.pattern,async_read_view(url.callback),url.default_args,url.name)
+            urls.append(url)
+        return urls
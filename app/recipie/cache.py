@@ -0,0 +1,183 @@
+"""Per-user versioned response cache for recipie APIs"""
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from rest_framework.response import Response
+
+
+def _generation_key(user_id):
+    return f'recipie:generation:{user_id}'
+
+def reset_generation(user_id):
+    """Start a fresh generation, so old keys of a reused user id never match"""
+    cache.set(_generation_key(user_id),time.time_ns(),timeout=None)
+
+def get_generation(user_id):
+    """Return the current cache generation of a user"""
+    key=_generation_key(user_id)
+    generation=cache.get(key)
+    if generation is None:
+        cache.add(key,time.time_ns(),timeout=None)
+        generation=cache.get(key)
+    return generation
+
+async def aget_generation(user_id):
+    """Async get_generation"""
+    key=_generation_key(user_id)
+    generation=await cache.aget(key)
+    if generation is None:
+        await cache.aadd(key,time.time_ns(),timeout=None)
+        generation=await cache.aget(key)
+    return generation
+
+def _incr_generation(user_id):
+    try:
+        cache.incr(_generation_key(user_id))
+    except ValueError:
+        reset_generation(user_id)
+
+def bump_generation(user_id):
+    """Invalidate every cached response of a user.
+
+    The generation is bumped again on commit, so a response computed
+    from the old rows while the transaction was open is never reused.
+    """
+    _incr_generation(user_id)
+    transaction.on_commit(lambda:_incr_generation(user_id))
+
+def response_cache_key(request,prefix):
+    """Return the cache key of a request for its user's current generation"""
+    user_id=request.user.pk
+    path=hashlib.sha1(request.get_full_path().encode()).hexdigest()
+    return f'recipie:{prefix}:{user_id}:{get_generation(user_id)}:{path}'
+
+async def aresponse_cache_key(request,prefix):
+    """Async response_cache_key"""
+    user_id=request.user.pk
+    path=hashlib.sha1(request.get_full_path().encode()).hexdigest()
+    return f'recipie:{prefix}:{user_id}:{await aget_generation(user_id)}:{path}'
+
+
+class CachedListMixin:
+    """Serve list responses from the cache until the user's data changes"""
+    response_cache_timeout=300
+    
+    def list(self,request,*args,**kwargs):
+        key=response_cache_key(request,'list')
+        data=cache.get(key)
+        if data is not None:
+            return Response(data)
+        response=super().list(request,*args,**kwargs)
+        if response.status_code==200:
+            cache.set(key,response.data,self.response_cache_timeout)
+        return response
+    
+    async def alist(self,request,*args,**kwargs):
+        key=await aresponse_cache_key(request,'list')
+        data=await cache.aget(key)
+        if data is not None:
+            return Response(data)
+        response=await super().alist(request,*args,**kwargs)
+        if response.status_code==200:
+            await cache.aset(key,response.data,self.response_cache_timeout)
+        return response
+    
+    
+class ConditionalGetMixin:
+    """Answer If-None-Match with 304 from the user's cache generation"""
+    
+    def get_etag(self,request):
+        """Return a strong ETag for the request at the current generation"""
+        prefix=f'etag:{self.action}:{request.accepted_renderer.format}'
+        digest=hashlib.sha1(response_cache_key(request,prefix).encode()).hexdigest()
+        return f'"{digest}"'
+    
+    async def aget_etag(self,request):
+        """Async get_etag"""
+        prefix=f'etag:{self.action}:{request.accepted_renderer.format}'
+        key=await aresponse_cache_key(request,prefix)
+        return f'"{hashlib.sha1(key.encode()).hexdigest()}"'
+    
+    def conditional_response(self,handler,request,*args,**kwargs):
+        """Return 304 if the client has the current version, else call handler"""
+        etag=self.get_etag(request)
+        response=get_conditional_response(request,etag=etag)
+        if response is None:
+            response=handler(request,*args,**kwargs)
+        if response.status_code in (200,304):
+            response['ETag']=etag
+        return response
+    
+    async def aconditional_response(self,handler,request,*args,**kwargs):
+        """Async conditional_response, for an async handler"""
+        etag=await self.aget_etag(request)
+        response=get_conditional_response(request,etag=etag)
+        if response is None:
+            response=await handler(request,*args,**kwargs)
+        if response.status_code in (200,304):
+            response['ETag']=etag
+        return response
+    
+    def list(self,request,*args,**kwargs):
+        return self.conditional_response(super().list,request,*args,**kwargs)
+    
+    async def alist(self,request,*args,**kwargs):
+        return await self.aconditional_response(super().alist,request,*args,**kwargs)
+    
+    
+FRAGMENT_VERSION=1
+
+def fragment_key(serializer_class,recipie):
+    """Return the fragment key of a recipie at its current updated_at"""
+    return (
+        f'recipie:fragment:{FRAGMENT_VERSION}:{serializer_class.__name__}:'
+        f'{recipie.id}:{recipie.updated_at.timestamp()}'
+    )
+
+
+class FragmentCacheMixin:
+    """Assemble recipie responses from cached per-recipie fragments.
+
+    Fragments are keyed by updated_at, which the signal handlers move
+    forward whenever a recipie, its links or one of its tags or
+    ingredients change, so stale fragments are simply never read again.
+    """
+    fragment_timeout=3600
+    
+    def use_fragments(self):
+        """Return True if this request is served from fragments"""
+        return getattr(settings,'RECIPIE_FRAGMENT_CACHE',False) and \
+            self.action in ('list','retrieve')
+    
+    def render_fragments(self,rows):
+        """Return representations of rows, rendering only uncached recipies"""
+        from recipie.serializers import sparse_fields
+        serializer_class=self.get_serializer_class()
+        keys={row.id:fragment_key(serializer_class,row) for row in rows}
+        cached=cache.get_many(keys.values())
+        fragments={pk:cached[key] for pk,key in keys.items() if key in cached}
+        missing=[pk for pk in keys if pk not in fragments]
+        if missing:
+            serializer=serializer_class(context={})
+            rendered={}
+            for recipie in self.get_fragment_queryset(missing):
+                fragments[recipie.id]=serializer.to_representation(recipie)
+                rendered[fragment_key(serializer_class,recipie)]=fragments[recipie.id]
+            cache.set_many(rendered,self.fragment_timeout)
+        fields=sparse_fields(self.request,serializer_class.Meta.fields)
+        return [
+            {name:fragments[row.id][name] for name in fields}
+            for row in rows if row.id in fragments
+        ]
+    
+    def list(self,request,*args,**kwargs):
+        if not self.use_fragments():
+            return super().list(request,*args,**kwargs)
+        queryset=self.filter_queryset(self.get_queryset())
+        page=self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.render_fragments(page))
+        return Response(self.render_fragments(queryset))
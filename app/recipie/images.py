@@ -0,0 +1,113 @@
+"""Resized, metadata-free derivatives of uploaded recipie images"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import django
+from django.conf import settings
+from django.db import connection,transaction
+from django.utils import timezone
+from PIL import Image,ImageOps
+from core.models import Recipie
+from core.storage import is_content_addressed
+from recipie.cache import bump_generation
+
+logger=logging.getLogger(__name__)
+
+# Bump the version when sizes or formats change, derived names are immutable
+DERIVATIVES_VERSION=1
+DERIVATIVES_DIR=os.path.join('uploads','recipie','derived',f'v{DERIVATIVES_VERSION}')
+# Largest first, so each size is resized from the previous one
+DERIVATIVE_SIZES={'large':1200,'medium':600,'thumb':150}
+DERIVATIVE_FORMATS=[
+    ('jpg','JPEG',{'quality':85,'optimize':True,'progressive':True}),
+    ('webp','WEBP',{'quality':80,'method':4}),
+]
+
+_executor=None
+_executor_lock=threading.Lock()
+
+
+def render_derivatives(source,media_root):
+    """Write resized JPEG and WebP copies of source and return their paths.
+
+    Runs in a worker process, so it only touches the filesystem. EXIF is
+    applied to the pixels and then dropped with the rest of the metadata.
+    """
+    stem=os.path.splitext(os.path.basename(source))[0]
+    if is_content_addressed(stem):
+        # Spread over prefix directories like the originals, for the collector
+        directory=os.path.join(DERIVATIVES_DIR,stem[:2],stem)
+    else:
+        directory=os.path.join(DERIVATIVES_DIR,stem)
+    derivatives={
+        name if ext=='jpg' else f'{name}_{ext}':os.path.join(directory,f'{name}.{ext}')
+        for name in DERIVATIVE_SIZES for ext,format,options in DERIVATIVE_FORMATS
+    }
+    if all(os.path.exists(os.path.join(media_root,path)) for path in derivatives.values()):
+        # Sources are content addressed, so an earlier upload already did the work
+        os.utime(os.path.join(media_root,directory))
+        return derivatives
+    os.makedirs(os.path.join(media_root,directory),exist_ok=True)
+    with Image.open(source) as img:
+        size=max(DERIVATIVE_SIZES.values())
+        img.draft('RGB',(size,size))
+        img=ImageOps.exif_transpose(img).convert('RGB')
+        for name,size in DERIVATIVE_SIZES.items():
+            img.thumbnail((size,size))
+            for ext,format,options in DERIVATIVE_FORMATS:
+                path=os.path.join(media_root,directory,f'{name}.{ext}')
+                # Write aside and rename, the same file may be rendered concurrently
+                tmp_path=f'{path}.{os.getpid()}.part'
+                img.save(tmp_path,format,**options)
+                os.replace(tmp_path,path)
+    return derivatives
+
+def get_executor():
+    """Return the process pool rendering derivatives, starting it on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Forking a process with request and pool threads can inherit held
+            # locks, so workers start clean from a forkserver and set Django up
+            _executor=ProcessPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS,
+                mp_context=multiprocessing.get_context('forkserver'),
+                initializer=django.setup,
+            )
+        return _executor
+
+def store_derivatives(recipie_id,user_id,name,derivatives):
+    """Record derivatives unless the recipie got another image meanwhile"""
+    updated=Recipie.objects.filter(pk=recipie_id,image=name).update(
+        image_derivatives=derivatives,
+        updated_at=timezone.now(),
+    )
+    if updated:
+        bump_generation(user_id)
+        
+def _finished(recipie_id,user_id,name,future):
+    """Store the result of a pool job, from the pool's result thread"""
+    try:
+        store_derivatives(recipie_id,user_id,name,future.result())
+    except Exception:
+        logger.exception('Rendering derivatives of %s failed',name)
+    finally:
+        connection.close()
+        
+def enqueue_derivatives(recipie):
+    """Render derivatives of the recipie image once the upload commits"""
+    args=(recipie.image.path,str(settings.MEDIA_ROOT))
+    done=partial(_finished,recipie.pk,recipie.user_id,recipie.image.name)
+    
+    def submit():
+        if not settings.IMAGE_WORKERS:
+            store_derivatives(
+                recipie.pk,recipie.user_id,recipie.image.name,render_derivatives(*args)
+            )
+            return
+        get_executor().submit(render_derivatives,*args).add_done_callback(done)
+        
+    transaction.on_commit(submit)
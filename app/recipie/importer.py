@@ -0,0 +1,95 @@
+"""Streaming NDJSON import of recipies"""
+import json
+import time
+from rest_framework.exceptions import ValidationError
+from recipie import serializers
+
+
+class RecipieImporter:
+    """Import recipies from NDJSON lines in chunks with bulk writes"""
+    max_errors=100
+    
+    def __init__(self,user,chunk_size=1000,progress=None):
+        self.user=user
+        self.chunk_size=chunk_size
+        self.progress=progress
+        self.resolved_attrs={field:{} for field in serializers.ATTR_MODELS}
+        self.imported=0
+        self.failed=0
+        self.errors=[]
+        self.started=None
+        
+    @property
+    def stats(self):
+        """Return counters and throughput of the import so far"""
+        seconds=time.monotonic()-self.started if self.started else 0.0
+        return {
+            'imported':self.imported,
+            'failed':self.failed,
+            'seconds':round(seconds,3),
+            'rate':round(self.imported/seconds,1) if seconds else 0.0,
+            'errors':self.errors,
+        }
+        
+    def run(self,lines):
+        """Import every recipie in an iterable of NDJSON lines"""
+        self.started=time.monotonic()
+        chunk=[]
+        for line_number,line in enumerate(lines,1):
+            if not line.strip():
+                continue
+            chunk.append((line_number,line))
+            if len(chunk)>=self.chunk_size:
+                self._import_chunk(chunk)
+                chunk=[]
+        if chunk:
+            self._import_chunk(chunk)
+        return self.stats
+    
+    def _error(self,line_number,detail):
+        """Record a rejected line"""
+        self.failed+=1
+        if len(self.errors)<self.max_errors:
+            self.errors.append({'line':line_number,'errors':detail})
+    
+    def _validate(self,chunk):
+        """Return validated data for the valid lines of a chunk"""
+        rows=[]
+        validator=serializers.RecipieDetailSerializer()
+        for line_number,line in chunk:
+            try:
+                data=json.loads(line)
+            except ValueError as exc:
+                self._error(line_number,{'non_field_errors':[str(exc)]})
+                continue
+            try:
+                validated=validator.run_validation(data)
+            except ValidationError as exc:
+                self._error(line_number,exc.detail)
+                continue
+            rows.append({**validated,'user':self.user})
+        return rows
+    
+    def _resolve(self,rows):
+        """Resolve names missing from the per-import cache"""
+        for field,model in serializers.ATTR_MODELS.items():
+            cache=self.resolved_attrs[field]
+            missing=[
+                item['name'] for row in rows for item in row.get(field,[])
+                if item['name'] not in cache
+            ]
+            cache.update(serializers.resolve_attrs(model,self.user,missing))
+    
+    def _import_chunk(self,chunk):
+        """Validate a chunk and write it in one transaction"""
+        rows=self._validate(chunk)
+        if rows:
+            self._resolve(rows)
+            writer=serializers.RecipieDetailSerializer(
+                many=True,
+                context={'resolved_attrs':self.resolved_attrs},
+            )
+            writer.create(rows)
+            self.imported+=len(rows)
+        if self.progress:
+            self.progress(self.stats)
@@ -0,0 +1,158 @@
+"""Pagination classes for recipie APIs"""
+import json
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor,CursorPagination,_reverse_ordering
+
+
+class OptInCursorPagination(CursorPagination):
+    """Cursor pagination applied only when the client asks for it"""
+    page_size=100
+    page_size_query_param='page_size'
+    max_page_size=1000
+    
+    def paginate_queryset(self,queryset,request,view=None):
+        """Paginate only when a cursor or page size is requested"""
+        if not self.is_requested(request):
+            return None
+        queryset=self.get_page_queryset(queryset,request,view)
+        return self.set_page(list(queryset))
+    
+    async def apaginate_queryset(self,queryset,request,view=None):
+        """paginate_queryset, fetching the page with the async ORM"""
+        if not self.is_requested(request):
+            return None
+        queryset=self.get_page_queryset(queryset,request,view)
+        return self.set_page([
+            obj async for obj in queryset.aiterator(chunk_size=self.page_size+1)
+        ])
+    
+    def get_page_queryset(self,queryset,request,view=None):
+        """Return the queryset of the requested page plus one row.
+
+        This is CursorPagination.paginate_queryset up to the query, split
+        out so the page can be fetched with or without the async ORM.
+        """
+        self.request=request
+        self.page_size=self.get_page_size(request)
+        self.base_url=request.build_absolute_uri()
+        self.ordering=self.get_ordering(request,queryset,view)
+        self.cursor=self.decode_cursor(request)
+        if self.cursor is None:
+            offset,self.reverse,self.current_position=0,False,None
+        else:
+            offset,self.reverse,self.current_position=self.cursor
+        self.offset=offset
+        
+        if self.reverse:
+            queryset=queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset=queryset.order_by(*self.ordering)
+        if self.current_position is not None:
+            order=self.ordering[0]
+            if self.cursor.reverse!=order.startswith('-'):
+                kwargs={order.lstrip('-')+'__lt':self.current_position}
+            else:
+                kwargs={order.lstrip('-')+'__gt':self.current_position}
+            queryset=queryset.filter(**kwargs)
+        return queryset[offset:offset+self.page_size+1]
+    
+    def set_page(self,results):
+        """Store the page and the positions around it, and return the page"""
+        self.page=list(results[:self.page_size])
+        if len(results)>len(self.page):
+            has_following_position=True
+            following_position=self._get_position_from_instance(results[-1],self.ordering)
+        else:
+            has_following_position=False
+            following_position=None
+        has_preceding_position=self.current_position is not None or self.offset>0
+        
+        if self.reverse:
+            self.page=list(reversed(self.page))
+            self.has_next=has_preceding_position
+            self.has_previous=has_following_position
+            self.next_position=self.current_position
+            self.previous_position=following_position
+        else:
+            self.has_next=has_following_position
+            self.has_previous=has_preceding_position
+            self.next_position=following_position
+            self.previous_position=self.current_position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls=True
+        return self.page
+    
+    def is_requested(self,request):
+        """Return True if the request opted in to pagination"""
+        params=request.query_params
+        return self.cursor_query_param in params or \
+            self.page_size_query_param in params
+
+
+class RecipieCursorPagination(OptInCursorPagination):
+    """Keyset pagination for recipies, newest first"""
+    ordering='-id'
+
+
+class NameKeysetPagination(OptInCursorPagination):
+    """Keyset pagination on (name, id) for tags and ingredients"""
+    ordering=('-name','-id')
+    
+    def get_page_queryset(self,queryset,request,view=None):
+        """Return the queryset of rows after the (name, id) in the cursor"""
+        self.request=request
+        self.page_size=self.get_page_size(request)
+        self.base_url=request.build_absolute_uri()
+        self.cursor=self.decode_cursor(request)
+        self.reverse=self.cursor is not None and self.cursor.reverse
+        
+        if self.reverse:
+            queryset=queryset.order_by('name','id')
+        else:
+            queryset=queryset.order_by(*self.ordering)
+        if self.cursor is not None:
+            name,pk=self._decode_position(self.cursor.position)
+            if self.reverse:
+                seek=Q(name__gt=name)|Q(name=name,id__gt=pk)
+            else:
+                seek=Q(name__lt=name)|Q(name=name,id__lt=pk)
+            queryset=queryset.filter(seek)
+        return queryset[:self.page_size+1]
+    
+    def set_page(self,results):
+        """Store the page and whether pages follow it, and return the page"""
+        has_more=len(results)>self.page_size
+        results=results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+            self.has_next=True
+            self.has_previous=has_more
+        else:
+            self.has_next=has_more
+            self.has_previous=self.cursor is not None
+        self.page=results
+        return self.page
+    
+    def _decode_position(self,position):
+        """Return the (name, id) pair stored in a cursor"""
+        try:
+            name,pk=json.loads(position)
+            return str(name),int(pk)
+        except (TypeError,ValueError):
+            raise NotFound(self.invalid_cursor_message)
+    
+    def _link(self,obj,reverse):
+        """Return a link to the page next to the given row"""
+        position=json.dumps([obj.name,obj.id])
+        return self.encode_cursor(Cursor(offset=0,reverse=reverse,position=position))
+    
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1],reverse=False)
+    
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self._link(self.page[0],reverse=True)
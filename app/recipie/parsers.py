@@ -0,0 +1,14 @@
+"""Parsers for recipie APIs"""
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """Accept newline delimited JSON bodies.
+
+    Import views read request.stream line by line, so the body is never
+    parsed as a whole; parse only exists for content negotiation.
+    """
+    media_type='application/x-ndjson'
+    
+    def parse(self,stream,media_type=None,parser_context=None):
+        return stream
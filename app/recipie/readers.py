@@ -0,0 +1,47 @@
+"""Read-only fast path for rendering recipie lists"""
+from collections import defaultdict
+from core.models import Recipie
+from recipie import serializers
+
+
+class RecipieListReader:
+    """Render RecipieSerializer output from values() rows.
+
+    Scalar columns go through the serializer's own fields, so the output
+    matches RecipieSerializer byte for byte, but no serializer is built
+    per row and tags and ingredients come from one grouped query each.
+    """
+    
+    def __init__(self,context=None):
+        self.fields=serializers.RecipieSerializer(context=context or {}).fields
+        self.columns=serializers.model_columns(self.fields)
+        
+    def values(self,queryset):
+        """Return the queryset as dicts holding only the rendered columns"""
+        return queryset.prefetch_related(None).values('id',*self.columns)
+    
+    def _links(self,field,ids):
+        """Group the tags or ingredients of recipies by recipie id"""
+        through=getattr(Recipie,field).through
+        name=serializers.ATTR_MODELS[field]._meta.model_name
+        links=through.objects.filter(recipie_id__in=ids).order_by(f'{name}_id')
+        grouped=defaultdict(list)
+        for recipie_id,pk,label in links.values_list('recipie_id',f'{name}_id',f'{name}__name'):
+            grouped[recipie_id].append({'id':pk,'name':label})
+        return grouped
+    
+    def render(self,rows):
+        """Return a list of recipie dicts for values() rows"""
+        rows=list(rows)
+        ids=[row['id'] for row in rows]
+        renderers=[]
+        for name,field in self.fields.items():
+            if name in serializers.ATTR_MODELS:
+                grouped=self._links(name,ids)
+                renderers.append((name,lambda row,grouped=grouped:grouped.get(row['id'],[])))
+            else:
+                column=serializers.FIELD_COLUMNS.get(name,name)
+                renderers.append((name,lambda row,column=column,field=field:(
+                    None if row[column] is None else field.to_representation(row[column])
+                )))
+        return [{name:render(row) for name,render in renderers} for row in rows]
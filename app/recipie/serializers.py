@@ -1,48 +1,246 @@
 """Serializers for recipie apis"""
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from drf_spectacular.utils import OpenApiParameter,OpenApiTypes
 from rest_framework import serializers
 from core.models import Recipie,Tag,Ingredient
+from recipie.cache import bump_generation
+from recipie.uploads import check_image
 
-class IngredientSerilizer(serializers.ModelSerializer):
+SPARSE_FIELDS_PARAMETERS=[
+    OpenApiParameter(
+        'fields',
+        OpenApiTypes.STR,
+        description='Comma separated list of fields to render',
+    ),
+    OpenApiParameter(
+        'omit',
+        OpenApiTypes.STR,
+        description='Comma separated list of fields to leave out',
+    ),
+]
+
+def sparse_fields(request,available):
+    """Return the fields a GET request asked for with ?fields= and ?omit="""
+    fields=list(available)
+    if request is None or request.method!='GET':
+        return fields
+    only=request.query_params.get('fields')
+    omit=request.query_params.get('omit')
+    if only:
+        only=set(only.split(','))
+        fields=[field for field in fields if field in only]
+    if omit:
+        omit=set(omit.split(','))
+        fields=[field for field in fields if field not in omit]
+    return fields
+
+class SparseFieldsMixin:
+    """Render only the fields requested with ?fields= and ?omit="""
+    
+    def get_fields(self):
+        fields=super().get_fields()
+        keep=sparse_fields(self.context.get('request'),fields)
+        return {name:fields[name] for name in keep}
+
+class DerivativeURLField(serializers.ReadOnlyField):
+    """Render storage URLs of recipie image derivatives.
+
+    With a variant, renders that variant's URL or None until it is ready,
+    otherwise a dict of every ready variant.
+    """
+    
+    def __init__(self,variant=None,**kwargs):
+        self.variant=variant
+        kwargs.setdefault('source','image_derivatives')
+        super().__init__(**kwargs)
+        
+    def to_representation(self,derivatives):
+        if self.variant is None:
+            return {name:IMAGE_STORAGE.url(path) for name,path in derivatives.items()}
+        path=derivatives.get(self.variant)
+        return IMAGE_STORAGE.url(path) if path else None
+
+class UniqueNameMixin:
+    """Reject renaming a tag or ingredient to a name the user already has"""
+    
+    def validate_name(self,value):
+        if self.parent is not None:
+            return value
+        queryset=self.Meta.model.objects.filter(
+            user=self.context['request'].user,
+            name=value,
+        )
+        if self.instance is not None:
+            queryset=queryset.exclude(id=self.instance.id)
+        if queryset.exists():
+            raise serializers.ValidationError('You already have one with this name.')
+        return value
+
+class IngredientSerilizer(UniqueNameMixin,serializers.ModelSerializer):
     """Serializer for ingredient"""
     class Meta:
         model=Ingredient
         fields=['id','name']
         read_only_fields=['id']
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(UniqueNameMixin,serializers.ModelSerializer):
     """Serializer for tags"""
     class Meta:
         model=Tag 
         fields=['id','name']
         read_only_fields=['id']
-class RecipieSerializer(serializers.ModelSerializer):
+IMAGE_STORAGE=Recipie._meta.get_field('image').storage
+ATTR_MODELS={'tags':Tag,'ingredients':Ingredient}
+# Read-only fields rendered from a differently named model column
+FIELD_COLUMNS={'thumbnail':'image_derivatives','images':'image_derivatives'}
+
+def model_columns(fields):
+    """Return the model columns behind the non-relation fields"""
+    columns=[]
+    for field in fields:
+        column=FIELD_COLUMNS.get(field,field)
+        if field not in ATTR_MODELS and column not in columns:
+            columns.append(column)
+    return columns
+
+def resolve_attrs(model,user,names):
+    """Map names to tags or ingredients of user, creating missing ones in bulk"""
+    names=list(dict.fromkeys(names))
+    if not names:
+        return {}
+    existing={
+        obj.name:obj
+        for obj in model.objects.filter(user=user,name__in=names)
+    }
+    missing=[
+        model(user=user,name=name)
+        for name in names if name not in existing
+    ]
+    if missing:
+        model.objects.bulk_create(missing,ignore_conflicts=True)
+        bump_generation(user.pk)
+        created=model.objects.filter(
+            user=user,
+            name__in=[obj.name for obj in missing],
+        )
+        for obj in created:
+            existing[obj.name]=obj
+    return existing
+
+def resolve_batch_attrs(user,validated_data):
+    """Resolve every tag and ingredient name used by a batch of recipies"""
+    return {
+        field:resolve_attrs(
+            model,
+            user,
+            [item['name'] for data in validated_data for item in data.get(field,[])],
+        )
+        for field,model in ATTR_MODELS.items()
+    }
+
+class RecipieListSerializer(serializers.ListSerializer):
+    """Create and update many recipies with a fixed number of queries"""
+    
+    def _get_resolved_attrs(self,validated_data):
+        """Return the name to object maps for the batch"""
+        resolved=self.context.get('resolved_attrs')
+        if resolved is None:
+            resolved=resolve_batch_attrs(self.context['request'].user,validated_data)
+        return resolved
+    
+    def _set_links(self,recipies,validated_data,resolved):
+        """Replace tags and ingredients of recipies by inserting and deleting the diff"""
+        for field in ATTR_MODELS:
+            through=getattr(Recipie,field).through
+            column=through._meta.get_field(ATTR_MODELS[field]._meta.model_name).attname
+            wanted={
+                recipie.id:{resolved[field][item['name']].id for item in data[field]}
+                for recipie,data in zip(recipies,validated_data)
+                if field in data
+            }
+            if not wanted:
+                continue
+            current={recipie_id:set() for recipie_id in wanted}
+            links=through.objects.filter(recipie_id__in=wanted).values_list('recipie_id',column)
+            for recipie_id,target_id in links:
+                current[recipie_id].add(target_id)
+            removed=Q()
+            added=[]
+            for recipie_id,target_ids in wanted.items():
+                stale=current[recipie_id]-target_ids
+                if stale:
+                    removed|=Q(recipie_id=recipie_id,**{f'{column}__in':stale})
+                added+=[
+                    through(recipie_id=recipie_id,**{column:target_id})
+                    for target_id in target_ids-current[recipie_id]
+                ]
+            if removed:
+                through.objects.filter(removed).delete()
+            through.objects.bulk_create(added)
+    
+    def _invalidate(self,recipies):
+        """Bump cache generations, since bulk writes send no signals"""
+        for user_id in {recipie.user_id for recipie in recipies}:
+            bump_generation(user_id)
+    
+    def _split(self,data):
+        """Split validated data into model fields and tag/ingredient lists"""
+        return {k:v for k,v in data.items() if k not in ATTR_MODELS}
+    
+    @transaction.atomic
+    def create(self,validated_data):
+        """Create recipies with one insert per table"""
+        resolved=self._get_resolved_attrs(validated_data)
+        recipies=Recipie.objects.bulk_create(
+            [Recipie(**self._split(data)) for data in validated_data]
+        )
+        self._set_links(recipies,validated_data,resolved)
+        self._invalidate(recipies)
+        return recipies
+    
+    @transaction.atomic
+    def update(self,instances,validated_data):
+        """Update recipies with one bulk update"""
+        resolved=self._get_resolved_attrs(validated_data)
+        fields={'updated_at'}
+        now=timezone.now()
+        for instance,data in zip(instances,validated_data):
+            instance.updated_at=now
+            for attr,value in self._split(data).items():
+                setattr(instance,attr,value)
+                fields.add(attr)
+        Recipie.objects.bulk_update(instances,fields)
+        self._set_links(instances,validated_data,resolved)
+        self._invalidate(instances)
+        return instances
+    
+class RecipieSerializer(SparseFieldsMixin,serializers.ModelSerializer):
     """Serializer for recipies"""
     tags=TagSerializer(many=True,required=False)
     ingredients=IngredientSerilizer(many=True,required=False)
+    thumbnail=DerivativeURLField('thumb')
     class Meta:
         model=Recipie
-        fields=['id','title','time_minutes','price','link','tags','ingredients']
+        fields=['id','title','time_minutes','price','link','tags','ingredients','thumbnail']
         read_only_fields=['id']
+        list_serializer_class=RecipieListSerializer
+        
+    def _resolve_attrs(self,model,items):
+        """Return tag or ingredient objects by name, creating missing ones in bulk"""
+        auth_user=self.context['request'].user 
+        return list(resolve_attrs(model,auth_user,[item['name'] for item in items]).values())
         
     def _get_or_create_tags(self,tags,recipie):
         """Handle getting or creating tags as needed"""
-        auth_user=self.context['request'].user 
-        for tag in tags:
-            tag_obj,created=Tag.objects.get_or_create(
-                user=auth_user,
-                **tag,
-            )
-            recipie.tags.add(tag_obj)
+        recipie.tags.add(*self._resolve_attrs(Tag,tags))
         
     def _get_or_create_ingredients(self,ingredients,recipie):
         """Handle getting or creating ingredients as needed"""
-        auth_user=self.context['request'].user 
-        for ingredient in ingredients:
-            ingredient_obj,create=Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingredient,
-            )
-            recipie.ingredients.add(ingredient_obj)
+        recipie.ingredients.add(*self._resolve_attrs(Ingredient,ingredients))
     
+    @transaction.atomic
     def create(self,validated_data):
         """Create a recipie"""
         tags=validated_data.pop('tags',[])
@@ -52,30 +250,62 @@ class RecipieSerializer(serializers.ModelSerializer):
         self._get_or_create_ingredients(ingredients,recipie)
         return recipie
     
+    @transaction.atomic
     def update(self,instance,validated_data):
         """Update recipie"""
         tags=validated_data.pop('tags',None)
         ingredients=validated_data.pop('ingredients',None)
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags,instance)
+            instance.tags.set(self._resolve_attrs(Tag,tags))
         if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients,instance)
+            instance.ingredients.set(self._resolve_attrs(Ingredient,ingredients))
         for attr,value in validated_data.items():
             setattr(instance,attr,value)
         instance.save()
         return instance
         
 class RecipieDetailSerializer(RecipieSerializer):
+    images=DerivativeURLField()
     class Meta(RecipieSerializer.Meta):
-        fields=RecipieSerializer.Meta.fields+['description']
+        fields=RecipieSerializer.Meta.fields+['description','images']
         
 class RecipieImageSerializer(serializers.ModelSerializer):
     """Serializer for uploading images to recipies"""
+    images=DerivativeURLField()
     class Meta:
         model=Recipie
-        fields=['id','image']
+        fields=['id','image','images']
         read_only_fields=['id']
         extra_kwargs={'image':{'required':'True'}}
-        
\ No newline at end of file
+        
+    def validate_image(self,value):
+        """Check the image limits without decoding it in full"""
+        try:
+            check_image(value)
+        except DjangoValidationError as error:
+            raise serializers.ValidationError(error.messages)
+        return value
+        
+class RecipieBulkOperationSerializer(serializers.Serializer):
+    """Serializer for one item of a bulk recipie request"""
+    action=serializers.ChoiceField(choices=['create','update','delete'])
+    id=serializers.IntegerField(required=False)
+    data=serializers.DictField(required=False,default=dict)
+    
+    def validate(self,attrs):
+        """Require an id for updates and deletes"""
+        if attrs['action']!='create' and 'id' not in attrs:
+            raise serializers.ValidationError(
+                {'id':'This field is required for updates and deletes.'}
+            )
+        return attrs
+    
+class RecipieBulkResultSerializer(serializers.Serializer):
+    """Serializer for the outcome of one bulk recipie operation"""
+    index=serializers.IntegerField()
+    action=serializers.CharField()
+    id=serializers.IntegerField(allow_null=True)
+    status=serializers.ChoiceField(
+        choices=['created','updated','deleted','not_found','invalid']
+    )
+    errors=serializers.DictField(required=False)
\ No newline at end of file
@@ -0,0 +1,56 @@
+"""Signal handlers keeping the recipie caches in sync with the database"""
+from django.conf import settings
+from django.db.models.signals import m2m_changed,post_delete,post_save,pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from core.models import Recipie,Tag,Ingredient
+from recipie.cache import bump_generation,reset_generation
+
+
+@receiver(post_save,sender=settings.AUTH_USER_MODEL)
+def start_user_generation(sender,instance,created,**kwargs):
+    """Give new users a fresh cache generation"""
+    if created:
+        reset_generation(instance.pk)
+
+@receiver(post_save,sender=Recipie)
+@receiver(post_delete,sender=Recipie)
+@receiver(post_save,sender=Tag)
+@receiver(post_delete,sender=Tag)
+@receiver(post_save,sender=Ingredient)
+@receiver(post_delete,sender=Ingredient)
+def invalidate_owner(sender,instance,**kwargs):
+    """Invalidate cached responses of the owner of a changed row"""
+    bump_generation(instance.user_id)
+
+@receiver(m2m_changed,sender=Recipie.tags.through)
+@receiver(m2m_changed,sender=Recipie.ingredients.through)
+def invalidate_links(sender,instance,action,reverse,pk_set,**kwargs):
+    """Invalidate cached responses and fragments when recipie links change"""
+    if action in ('post_add','post_remove','post_clear'):
+        bump_generation(instance.user_id)
+    if not reverse and action in ('post_add','post_remove','post_clear'):
+        touch_recipies(pk=instance.pk)
+    elif reverse and action in ('post_add','post_remove') and pk_set:
+        touch_recipies(pk__in=pk_set)
+    elif reverse and action=='pre_clear':
+        field='tags' if sender is Recipie.tags.through else 'ingredients'
+        touch_recipies(**{field:instance})
+
+def touch_recipies(**filters):
+    """Move updated_at of matching recipies forward, retiring their fragments"""
+    Recipie.objects.filter(**filters).update(updated_at=timezone.now())
+
+@receiver(post_save,sender=Tag)
+@receiver(pre_delete,sender=Tag)
+def touch_tagged_recipies(sender,instance,created=False,**kwargs):
+    """Refresh recipies rendering a renamed or deleted tag"""
+    if not created:
+        touch_recipies(tags=instance)
+
+@receiver(post_save,sender=Ingredient)
+@receiver(pre_delete,sender=Ingredient)
+def touch_recipies_with_ingredient(sender,instance,created=False,**kwargs):
+    """Refresh recipies rendering a renamed or deleted ingredient"""
+    if not created:
+        touch_recipies(ingredients=instance)
@@ -0,0 +1,129 @@
+"""Tests for the async recipie read views"""
+from asgiref.sync import async_to_sync,iscoroutinefunction
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import RequestFactory,TestCase
+from rest_framework.authtoken.models import Token
+from core.models import Recipie,Tag,Ingredient
+from recipie import views
+from recipie.async_views import AsyncReadRouter,async_read_view
+
+RECIPIES_PATH='/api/recipie/recipies/'
+
+def render(response):
+    """Render a response the way the handler would"""
+    if hasattr(response,'render'):
+        response.render()
+    return response
+
+class AsyncReadViewTests(TestCase):
+    """Test the async views answer exactly like the sync ones"""
+    def setUp(self):
+        cache.clear()
+        self.factory=RequestFactory()
+        self.user=get_user_model().objects.create_user('user@example.com','testpass123')
+        self.token=Token.objects.create(user=self.user)
+        self.tags=[Tag.objects.create(user=self.user,name=f'Tag {i}') for i in range(3)]
+        salt=Ingredient.objects.create(user=self.user,name='Salt')
+        for i in range(5):
+            recipie=Recipie.objects.create(
+                user=self.user,title=f'Recipie {i}',time_minutes=i+1,
+                price=Decimal('2.50'),description='Slow',
+            )
+            recipie.tags.add(*self.tags[i%3:])
+            if i%2:
+                recipie.ingredients.add(salt)
+                
+    def request(self,path,params=None,**headers):
+        headers.setdefault('HTTP_AUTHORIZATION',f'Token {self.token.key}')
+        return self.factory.get(path,params or {},**headers)
+    
+    def assertSameResponse(self,viewset,actions,path,params=None,**kwargs):
+        """Assert the sync and async views give the same response"""
+        sync_view=viewset.as_view(actions)
+        async_view=async_read_view(sync_view)
+        headers=kwargs.pop('headers',{})
+        expected=render(sync_view(self.request(path,params,**headers),**kwargs))
+        actual=async_to_sync(async_view)(self.request(path,params,**headers),**kwargs)
+        self.assertEqual(actual.status_code,expected.status_code)
+        self.assertEqual(actual.content,expected.content)
+        for header in ('Content-Type','ETag','Last-Modified'):
+            self.assertEqual(actual.get(header),expected.get(header))
+        return actual
+    
+    def test_recipie_list_matches(self):
+        """Test recipie lists match across filters, fields and pages"""
+        for params in ({},{'tags':self.tags[2].id},{'fields':'id,tags'},{'page_size':2}):
+            res=self.assertSameResponse(views.RecipieViewSet,{'get':'list'},RECIPIES_PATH,params)
+            self.assertEqual(res.status_code,200)
+            
+    def test_recipie_cursor_pages_match(self):
+        """Test following a cursor gives the same page"""
+        sync_view=views.RecipieViewSet.as_view({'get':'list'})
+        page=render(sync_view(self.request(RECIPIES_PATH,{'page_size':2})))
+        cursor=page.data['next'].split('cursor=')[1].split('&')[0]
+        self.assertSameResponse(
+            views.RecipieViewSet,{'get':'list'},RECIPIES_PATH,
+            {'page_size':2,'cursor':cursor},
+        )
+        
+    def test_recipie_retrieve_matches(self):
+        """Test retrieve, missing recipies and conditional requests match"""
+        recipie=Recipie.objects.first()
+        path=f'{RECIPIES_PATH}{recipie.id}/'
+        res=self.assertSameResponse(views.RecipieViewSet,{'get':'retrieve'},path,pk=recipie.id)
+        self.assertEqual(res.status_code,200)
+        
+        res=self.assertSameResponse(
+            views.RecipieViewSet,{'get':'retrieve'},path,pk=recipie.id,
+            headers={'HTTP_IF_NONE_MATCH':res['ETag']},
+        )
+        self.assertEqual(res.status_code,304)
+        res=self.assertSameResponse(views.RecipieViewSet,{'get':'retrieve'},path,pk=0)
+        self.assertEqual(res.status_code,404)
+        
+    def test_tag_and_ingredient_lists_match(self):
+        """Test attribute lists match, also when paginated"""
+        for viewset,path in ((views.TagViewSet,'/api/recipie/tags/'),
+                             (views.IngredientViewSet,'/api/recipie/ingredients/')):
+            for params in ({},{'assigned_only':1},{'page_size':1}):
+                self.assertSameResponse(viewset,{'get':'list'},path,params)
+                
+    def test_authentication_errors_match(self):
+        """Test missing and invalid tokens are rejected the same way"""
+        for token in ('','Token wrong'):
+            res=self.assertSameResponse(
+                views.RecipieViewSet,{'get':'list'},RECIPIES_PATH,
+                headers={'HTTP_AUTHORIZATION':token},
+            )
+            self.assertEqual(res.status_code,401)
+            
+    def test_list_queries_run_async(self):
+        """Test the async list uses the async ORM for its queries"""
+        async_view=async_read_view(views.RecipieViewSet.as_view({'get':'list'}))
+        with self.assertNumQueries(4):
+            # token, recipies, tags, ingredients
+            res=async_to_sync(async_view)(self.request(RECIPIES_PATH))
+        self.assertEqual(res.status_code,200)
+        
+    def test_writes_use_sync_view(self):
+        """Test other methods go through the sync view"""
+        async_view=async_read_view(views.RecipieViewSet.as_view({'get':'list','post':'create'}))
+        request=self.factory.post(
+            RECIPIES_PATH,
+            {'title':'New','time_minutes':3,'price':'1.00'},
+            content_type='application/json',
+            HTTP_AUTHORIZATION=f'Token {self.token.key}',
+        )
+        res=async_to_sync(async_view)(request)
+        self.assertEqual(render(res).status_code,201)
+        self.assertTrue(Recipie.objects.filter(title='New').exists())
+        
+    def test_router_wraps_read_routes(self):
+        """Test the router serves only list and retrieve GETs async"""
+        router=AsyncReadRouter()
+        router.register('recipies',views.RecipieViewSet)
+        router.register('tags',views.TagViewSet)
+        wrapped={url.name for url in router.urls if iscoroutinefunction(url.callback)}
+        self.assertEqual(wrapped,{'recipie-list','recipie-detail','tag-list'})
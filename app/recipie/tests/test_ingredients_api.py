@@ -124,4 +124,17 @@ class PrivateIngredientsApiTests(TestCase):
         
         res=self.client.get(INGREDIENTS_URL,{'assigned_only':1})
         
-        self.assertEqual(len(res.data),1)
\ No newline at end of file
+        self.assertEqual(len(res.data),1)
+        
+    def test_filter_ingredients_starts_with_paginated(self):
+        """Test seeking ingredients by prefix one page at a time"""
+        for name in ['Salt','Saffron','Sage','Sugar']:
+            Ingredient.objects.create(user=self.user,name=name)
+            
+        res=self.client.get(INGREDIENTS_URL,{'starts_with':'Sa','page_size':2})
+        
+        self.assertEqual(res.status_code,status.HTTP_200_OK)
+        self.assertEqual([i['name'] for i in res.data['results']],['Salt','Sage'])
+        res=self.client.get(res.data['next'])
+        self.assertEqual([i['name'] for i in res.data['results']],['Saffron'])
+        self.assertIsNone(res.data['next'])
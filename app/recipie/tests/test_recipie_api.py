@@ -1,17 +1,37 @@
 """Test for recipie APIs"""
 from decimal import Decimal 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.test import TestCase,override_settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse 
 from rest_framework import status 
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from core.models import Recipie,Tag,Ingredient
 from recipie.serializers import RecipieSerializer ,RecipieDetailSerializer
+from recipie.readers import RecipieListReader
+from recipie.images import store_derivatives
+from core.storage import is_content_addressed
+from recipie.uploads import LimitedUploadHandler,check_image
+from PIL.JpegImagePlugin import JpegImageFile
+from rest_framework.renderers import JSONRenderer
+from django.db.models import Prefetch
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from recipie.cache import bump_generation
+import json
+import shutil
 import tempfile
+from unittest.mock import patch
+from asgiref.sync import sync_to_async
 import os 
 from PIL import Image 
 
 RECIPIES_URL=reverse('recipie:recipie-list')
+BULK_URL=reverse('recipie:recipie-bulk')
+IMPORT_URL=reverse('recipie:recipie-import-recipies')
+EXPORT_URL=reverse('recipie:recipie-export')
 
 def detail_url(recipie_id):
     """Create and return a recipie detail URL"""
@@ -277,6 +297,44 @@ class PrivateRecipieAPITests(TestCase):
         self.assertEqual(res.status_code,status.HTTP_200_OK)
         self.assertEqual(recipie.tags.count(),0)
         
+    def test_update_recipie_tags_writes_only_diff(self):
+        """Test updating tags deletes and inserts only changed links"""
+        recipie=create_recipie(user=self.user)
+        keep=Tag.objects.create(user=self.user,name='Keep')
+        drop=Tag.objects.create(user=self.user,name='Drop')
+        recipie.tags.add(keep,drop)
+        through=Recipie.tags.through.objects
+        kept_link=through.get(recipie=recipie,tag=keep)
+        
+        payload={'tags':[{'name':'Keep'},{'name':'New'}]}
+        res=self.client.patch(detail_url(recipie.id),payload,format='json')
+        
+        self.assertEqual(res.status_code,status.HTTP_200_OK)
+        self.assertTrue(through.filter(id=kept_link.id).exists())
+        self.assertEqual(
+            set(recipie.tags.values_list('name',flat=True)),
+            {'Keep','New'}
+        )
+        
+    def test_noop_update_does_not_write_links(self):
+        """Test a patch with unchanged tags and ingredients writes no links"""
+        recipie=create_recipie(user=self.user)
+        recipie.tags.add(Tag.objects.create(user=self.user,name='Lunch'))
+        recipie.ingredients.add(
+            Ingredient.objects.create(user=self.user,name='Rice')
+        )
+        payload={'tags':[{'name':'Lunch'}],'ingredients':[{'name':'Rice'}]}
+        
+        with CaptureQueriesContext(connection) as ctx:
+            res=self.client.patch(detail_url(recipie.id),payload,format='json')
+            
+        self.assertEqual(res.status_code,status.HTTP_200_OK)
+        for query in ctx.captured_queries:
+            sql=query['sql'].upper()
+            if sql.startswith(('INSERT','DELETE')):
+                self.assertNotIn('CORE_RECIPIE_TAGS',sql)
+                self.assertNotIn('CORE_RECIPIE_INGREDIENTS',sql)
+        
     def test_create_recipie_with_new_ingredients(self):
         """Test creating a recipie with new ingredients"""
         payload={
@@ -401,6 +459,653 @@ class PrivateRecipieAPITests(TestCase):
         self.assertIn(s2.data,res.data)
         self.assertNotIn(s3.data,res.data)
         
+    def test_filter_by_tags_match_all(self):
+        """Test filtering recipies having every requested tag"""
+        vegan=Tag.objects.create(user=self.user,name='Vegan')
+        quick=Tag.objects.create(user=self.user,name='Quick')
+        both=create_recipie(user=self.user,title='Salad')
+        both.tags.add(vegan,quick)
+        one=create_recipie(user=self.user,title='Curry')
+        one.tags.add(vegan)
+        
+        params={'tags':f'{vegan.id},{quick.id}','match':'all'}
+        res=self.client.get(RECIPIES_URL,params)
+        
+        self.assertEqual([r['id'] for r in res.data],[both.id])
+        
+    def test_filter_by_tags_and_ingredients_no_duplicates(self):
+        """Test recipies matching several IDs are listed once"""
+        tag1=Tag.objects.create(user=self.user,name='Vegan')
+        tag2=Tag.objects.create(user=self.user,name='Quick')
+        ingredient=Ingredient.objects.create(user=self.user,name='Tofu')
+        recipie=create_recipie(user=self.user)
+        recipie.tags.add(tag1,tag2)
+        recipie.ingredients.add(ingredient)
+        
+        params={'tags':f'{tag1.id},{tag2.id}','ingredients':f'{ingredient.id}'}
+        with CaptureQueriesContext(connection) as ctx:
+            res=self.client.get(RECIPIES_URL,params)
+        
+        self.assertEqual([r['id'] for r in res.data],[recipie.id])
+        self.assertIn('EXISTS',ctx.captured_queries[0]['sql'])
+        self.assertNotIn('DISTINCT',ctx.captured_queries[0]['sql'])
+        
+class RecipieQueryCountTests(TestCase):
+    """Test the number of queries issued by the recipie endpoints"""
+    def setUp(self):
+        self.client=APIClient()
+        self.user=create_user(email='user@example.com',password='testpass123')
+        self.client.force_authenticate(self.user)
+        
+    def _create_recipies(self,count):
+        """Create recipies with a tag and an ingredient each"""
+        start=Recipie.objects.count()
+        for i in range(start,start+count):
+            recipie=create_recipie(user=self.user,title=f'Recipie {i}')
+            recipie.tags.add(Tag.objects.create(user=self.user,name=f'Tag {i}'))
+            recipie.ingredients.add(
+                Ingredient.objects.create(user=self.user,name=f'Ingredient {i}')
+            )
+        
+    def test_list_query_count_is_constant(self):
+        """Test listing recipies runs the same queries for 1 and 10 rows"""
+        self._create_recipies(1)
+        with self.assertNumQueries(3):
+            res=self.client.get(RECIPIES_URL)
+        self.assertEqual(len(res.data),1)
+        
+        self._create_recipies(9)
+        with self.assertNumQueries(3):
+            res=self.client.get(RECIPIES_URL)
+        self.assertEqual(len(res.data),10)
+        
+    def test_filtered_list_query_count_is_constant(self):
+        """Test filtering recipies does not add per row queries"""
+        self._create_recipies(5)
+        tag_ids=','.join(str(tag.id) for tag in Tag.objects.all())
+        with self.assertNumQueries(3):
+            res=self.client.get(RECIPIES_URL,{'tags':tag_ids})
+        self.assertEqual(len(res.data),5)
+        
+    def test_detail_query_count(self):
+        """Test retrieving a recipie prefetches tags and ingredients"""
+        self._create_recipies(1)
+        recipie=Recipie.objects.get(user=self.user)
+        with self.assertNumQueries(3):
+            res=self.client.get(detail_url(recipie.id))
+        self.assertEqual(res.data,RecipieDetailSerializer(recipie).data)
+        
+    def test_list_defers_heavy_columns(self):
+        """Test listing recipies does not load description and image"""
+        self._create_recipies(1)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(RECIPIES_URL)
+        recipie_sql=ctx.captured_queries[0]['sql']
+        self.assertNotIn('"description"',recipie_sql)
+        self.assertNotIn('"image"',recipie_sql)
+        
+    def _create_with_attrs(self,count):
+        """Post a recipie with count new tags and ingredients"""
+        Tag.objects.create(user=self.user,name='Existing')
+        payload={
+            'title':f'Recipie with {count}',
+            'time_minutes':10,
+            'price':Decimal('2.50'),
+            'tags':[{'name':'Existing'}]+[{'name':f'Tag {i}'} for i in range(count)],
+            'ingredients':[{'name':f'Ingredient {i}'} for i in range(count)],
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            res=self.client.post(RECIPIES_URL,payload,format='json')
+        self.assertEqual(res.status_code,status.HTTP_201_CREATED)
+        recipie=Recipie.objects.get(id=res.data['id'])
+        self.assertEqual(recipie.tags.count(),count+1)
+        self.assertEqual(recipie.ingredients.count(),count)
+        return len(ctx.captured_queries)
+    
+    def test_create_query_count_independent_of_attrs(self):
+        """Test creating a recipie resolves tags and ingredients in batches"""
+        one=self._create_with_attrs(1)
+        Tag.objects.all().delete()
+        Ingredient.objects.all().delete()
+        thirty=self._create_with_attrs(30)
+        self.assertEqual(one,thirty)
+        
+class RecipiePaginationTests(TestCase):
+    """Test opt-in cursor pagination of recipies"""
+    def setUp(self):
+        self.client=APIClient()
+        self.user=create_user(email='user@example.com',password='testpass123')
+        self.client.force_authenticate(self.user)
+        
+    def test_list_not_paginated_by_default(self):
+        """Test listing recipies without a cursor returns a plain list"""
+        create_recipie(user=self.user)
+        res=self.client.get(RECIPIES_URL)
+        self.assertEqual(res.status_code,status.HTTP_200_OK)
+        self.assertIsInstance(res.data,list)
+        
+    def test_paginate_with_cursor(self):
+        """Test walking all pages forward and back with cursors"""
+        recipies=[create_recipie(user=self.user,title=f'R{i}') for i in range(5)]
+        expected=[r.id for r in reversed(recipies)]
+        
+        res=self.client.get(RECIPIES_URL,{'page_size':2})
+        self.assertEqual(res.status_code,status.HTTP_200_OK)
+        self.assertIsNone(res.data['previous'])
+        self.assertNotIn('count',res.data)
+        ids=[r['id'] for r in res.data['results']]
+        while res.data['next']:
+            res=self.client.get(res.data['next'])
+            ids+=[r['id'] for r in res.data['results']]
+        self.assertEqual(ids,expected)
+        
+        res=self.client.get(res.data['previous'])
+        self.assertEqual([r['id'] for r in res.data['results']],expected[2:4])
+        
+    def test_paginate_filtered_by_tags(self):
+        """Test next cursor keeps the tags filter"""
+        tag=Tag.objects.create(user=self.user,name='Vegan')
+        tagged=[]
+        for i in range(3):
+            recipie=create_recipie(user=self.user,title=f'Tagged {i}')
+            recipie.tags.add(tag)
+            tagged.append(recipie.id)
+            create_recipie(user=self.user,title=f'Untagged {i}')
+            
+        res=self.client.get(RECIPIES_URL,{'page_size':2,'tags':tag.id})
+        ids=[r['id'] for r in res.data['results']]
+        res=self.client.get(res.data['next'])
+        ids+=[r['id'] for r in res.data['results']]
+        self.assertIsNone(res.data['next'])
+        self.assertEqual(ids,sorted(tagged,reverse=True))
+        
+    def test_paginated_query_count(self):
+        """Test a page is fetched without COUNT or OFFSET"""
+        for i in range(5):
+            create_recipie(user=self.user,title=f'R{i}')
+        res=self.client.get(RECIPIES_URL,{'page_size':2})
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(res.data['next'])
+        self.assertEqual(len(ctx.captured_queries),3)
+        for query in ctx.captured_queries:
+            self.assertNotIn('COUNT(',query['sql'].upper())
+            self.assertNotIn('OFFSET',query['sql'].upper())
+        
+class RecipieBulkTests(TestCase):
+    """Test the bulk recipie endpoint"""
+    def setUp(self):
+        self.client=APIClient()
+        self.user=create_user(email='user@example.com',password='testpass123')
+        self.client.force_authenticate(self.user)
+        
+    def test_bulk_create_update_delete(self):
+        """Test mixing creates, updates and deletes in one request"""
+        to_update=create_recipie(user=self.user,title='Old title')
+        to_update.tags.add(Tag.objects.create(user=self.user,name='Stale'))
+        to_delete=create_recipie(user=self.user)
+        payload=[
+            {'action':'create','data':{
+                'title':'Pancakes',
+                'time_minutes':15,
+                'price':'3.50',
+                'tags':[{'name':'Breakfast'}],
+                'ingredients':[{'name':'Flour'},{'name':'Milk'}],
+            }},
+            {'action':'update','id':to_update.id,'data':{
+                'title':'New title',
+                'tags':[{'name':'Breakfast'}],
+            }},
+            {'action':'delete','id':to_delete.id},
+            {'action':'delete','id':to_delete.id+100},
+        ]
+        
+        res=self.client.post(BULK_URL,payload,format='json')
+        
+        self.assertEqual(res.status_code,status.HTTP_200_OK)
+        self.assertEqual(
+            [r['status'] for r in res.data],
+            ['created','updated','deleted','not_found']
+        )
+        created=Recipie.objects.get(id=res.data[0]['id'])
+        self.assertEqual(created.user,self.user)
+        self.assertEqual(
+            set(created.ingredients.values_list('name',flat=True)),
+            {'Flour','Milk'}
+        )
+        to_update.refresh_from_db()
+        self.assertEqual(to_update.title,'New title')
+        self.assertEqual(list(to_update.tags.values_list('name',flat=True)),['Breakfast'])
+        self.assertEqual(Tag.objects.filter(user=self.user,name='Breakfast').count(),1)
+        self.assertFalse(Recipie.objects.filter(id=to_delete.id).exists())
+        
+    def test_bulk_invalid_item_writes_nothing(self):
+        """Test one invalid item rejects the whole batch"""
+        recipie=create_recipie(user=self.user)
+        payload=[
+            {'action':'create','data':{'title':'No price','time_minutes':5}},
+            {'action':'delete','id':recipie.id},
+        ]
+        
+        res=self.client.post(BULK_URL,payload,format='json')
+        
+        self.assertEqual(res.status_code,status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0]['status'],'invalid')
+        self.assertIn('price',res.data[0]['errors'])
+        self.assertTrue(Recipie.objects.filter(id=recipie.id).exists())
+        
+    def test_bulk_cannot_touch_other_users_recipies(self):
+        """Test bulk updates and deletes are limited to the user"""
+        other=create_user(email='other@example.com',password='testpass123')
+        recipie=create_recipie(user=other)
+        payload=[
+            {'action':'update','id':recipie.id,'data':{'title':'Mine now'}},
+            {'action':'delete','id':recipie.id},
+        ]
+        
+        res=self.client.post(BULK_URL,payload,format='json')
+        
+        self.assertEqual([r['status'] for r in res.data],['not_found','not_found'])
+        self.assertTrue(Recipie.objects.filter(id=recipie.id,user=other).exists())
+        
+    def test_bulk_query_count_independent_of_size(self):
+        """Test the number of queries does not grow with the batch"""
+        def run(count):
+            payload=[
+                {'action':'create','data':{
+                    'title':f'Recipie {i}',
+                    'time_minutes':5,
+                    'price':'1.00',
+                    'tags':[{'name':f'Tag {i}'}],
+                }}
+                for i in range(count)
+            ]
+            with CaptureQueriesContext(connection) as ctx:
+                res=self.client.post(BULK_URL,payload,format='json')
+            self.assertEqual(res.status_code,status.HTTP_200_OK)
+            return len(ctx.captured_queries)
+        self.assertEqual(run(2),run(20))
+        
+class RecipieImportTests(TestCase):
+    """Test the NDJSON recipie import endpoint"""
+    def setUp(self):
+        self.client=APIClient()
+        self.user=create_user(email='user@example.com',password='testpass123')
+        self.client.force_authenticate(self.user)
+        
+    def test_import_ndjson(self):
+        """Test importing recipies line by line"""
+        lines=[
+            {'title':'Soup','time_minutes':20,'price':'4.00',
+             'tags':[{'name':'Dinner'}],'ingredients':[{'name':'Leek'}]},
+            {'title':'Stew','time_minutes':90,'price':'6.50',
+             'tags':[{'name':'Dinner'}]},
+        ]
+        body='\n'.join(json.dumps(line) for line in lines)+'\n\n'
+        
+        res=self.client.post(IMPORT_URL,body,content_type='application/x-ndjson')
+        
+        self.assertEqual(res.status_code,status.HTTP_200_OK)
+        self.assertEqual(res.data['imported'],2)
+        self.assertEqual(res.data['failed'],0)
+        recipies=Recipie.objects.filter(user=self.user)
+        self.assertEqual(recipies.count(),2)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(),1)
+        soup=recipies.get(title='Soup')
+        self.assertEqual(list(soup.ingredients.values_list('name',flat=True)),['Leek'])
+        
+    def test_import_reports_bad_lines(self):
+        """Test invalid lines are reported and skipped"""
+        body='not json\n{"title":"No price","time_minutes":1}\n' \
+            '{"title":"Toast","time_minutes":2,"price":"1.00"}\n'
+            
+        res=self.client.post(IMPORT_URL,body,content_type='application/x-ndjson')
+        
+        self.assertEqual(res.status_code,status.HTTP_200_OK)
+        self.assertEqual(res.data['imported'],1)
+        self.assertEqual(res.data['failed'],2)
+        self.assertEqual([e['line'] for e in res.data['errors']],[1,2])
+        self.assertIn('price',res.data['errors'][1]['errors'])
+        
+class RecipieExportTests(TestCase):
+    """Test the streaming recipie export endpoint"""
+    def setUp(self):
+        self.client=APIClient()
+        self.user=create_user(email='user@example.com',password='testpass123')
+        self.client.force_authenticate(self.user)
+        for i in range(5):
+            recipie=create_recipie(user=self.user,title=f'Recipie {i}')
+            recipie.tags.add(Tag.objects.create(user=self.user,name=f'Tag {i}'))
+        create_recipie(user=create_user(email='other@example.com',password='pass12345'))
+        
+    def _expected(self):
+        recipies=Recipie.objects.filter(user=self.user).order_by('-id')
+        return json.loads(json.dumps(RecipieDetailSerializer(recipies,many=True).data))
+        
+    def test_export_json(self):
+        """Test exporting the users recipies as a JSON array"""
+        res=self.client.get(EXPORT_URL)
+        
+        self.assertEqual(res.status_code,status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'],'application/json')
+        body=b''.join(res.streaming_content)
+        self.assertEqual(json.loads(body),self._expected())
+        
+    @patch('recipie.views.RecipieViewSet.export_chunk_size',2)
+    def test_export_ndjson_in_chunks(self):
+        """Test exporting as NDJSON prefetches per chunk"""
+        with CaptureQueriesContext(connection) as ctx:
+            res=self.client.get(EXPORT_URL,{'stream_format':'ndjson'})
+            lines=b''.join(res.streaming_content).decode().splitlines()
+            
+        self.assertEqual(res['Content-Type'],'application/x-ndjson')
+        self.assertEqual([json.loads(line) for line in lines],self._expected())
+        self.assertEqual(len(ctx.captured_queries),1+3*2)
+        
+    @patch('recipie.views.RecipieViewSet.export_chunk_size',2)
+    async def test_export_streams_under_asgi(self):
+        """Test the export is an async stream under ASGI"""
+        token=await Token.objects.acreate(user=self.user)
+        res=await self.async_client.get(
+            EXPORT_URL,
+            {'stream_format':'ndjson'},
+            headers={'Authorization':f'Token {token.key}'},
+        )
+        
+        self.assertTrue(res.is_async)
+        lines=b''.join([part async for part in res.streaming_content]).decode().splitlines()
+        expected=await sync_to_async(self._expected)()
+        self.assertEqual([json.loads(line) for line in lines],expected)
+        
+    def test_export_empty(self):
+        """Test exporting with no recipies gives an empty array"""
+        Recipie.objects.filter(user=self.user).delete()
+        res=self.client.get(EXPORT_URL)
+        self.assertEqual(json.loads(b''.join(res.streaming_content)),[])
+        
+    def test_export_invalid_format(self):
+        """Test an unknown export format is rejected"""
+        res=self.client.get(EXPORT_URL,{'stream_format':'xml'})
+        self.assertEqual(res.status_code,status.HTTP_400_BAD_REQUEST)
+        
+class RecipieResponseCacheTests(TestCase):
+    """Test the per-user list response cache"""
+    def setUp(self):
+        self.client=APIClient()
+        self.user=create_user(email='user@example.com',password='testpass123')
+        self.client.force_authenticate(self.user)
+        self.recipie=create_recipie(user=self.user)
+        
+    def test_repeated_list_served_from_cache(self):
+        """Test polling the list again does not query the database"""
+        res=self.client.get(RECIPIES_URL)
+        with self.assertNumQueries(0):
+            cached=self.client.get(RECIPIES_URL)
+        self.assertEqual(cached.status_code,status.HTTP_200_OK)
+        self.assertEqual(cached.data,res.data)
+        
+    def test_write_invalidates_cached_list(self):
+        """Test saving, linking and deleting invalidate the cached list"""
+        self.client.get(RECIPIES_URL)
+        self.client.patch(detail_url(self.recipie.id),{'title':'Renamed'})
+        res=self.client.get(RECIPIES_URL)
+        self.assertEqual(res.data[0]['title'],'Renamed')
+        
+        self.recipie.tags.add(Tag.objects.create(user=self.user,name='Lunch'))
+        res=self.client.get(RECIPIES_URL)
+        self.assertEqual(res.data[0]['tags'][0]['name'],'Lunch')
+        
+        tag=Tag.objects.get(user=self.user)
+        tag.name='Supper'
+        tag.save()
+        res=self.client.get(RECIPIES_URL)
+        self.assertEqual(res.data[0]['tags'][0]['name'],'Supper')
+        
+        self.recipie.delete()
+        res=self.client.get(RECIPIES_URL)
+        self.assertEqual(res.data,[])
+        
+    def test_bulk_write_invalidates_cached_list(self):
+        """Test bulk writes without signals still invalidate the list"""
+        self.client.get(RECIPIES_URL)
+        payload=[{'action':'update','id':self.recipie.id,'data':{'title':'Bulk'}}]
+        self.client.post(BULK_URL,payload,format='json')
+        res=self.client.get(RECIPIES_URL)
+        self.assertEqual(res.data[0]['title'],'Bulk')
+        
+    def test_cache_is_per_user_and_query(self):
+        """Test cached lists are not shared across users or filters"""
+        self.client.get(RECIPIES_URL)
+        other=create_user(email='other@example.com',password='testpass123')
+        create_recipie(user=other,title='Other')
+        self.client.force_authenticate(other)
+        res=self.client.get(RECIPIES_URL)
+        self.assertEqual([r['title'] for r in res.data],['Other'])
+        
+        res=self.client.get(RECIPIES_URL,{'tags':'0'})
+        self.assertEqual(res.data,[])
+        
+class RecipieConditionalGetTests(TestCase):
+    """Test ETag and Last-Modified handling of recipie endpoints"""
+    def setUp(self):
+        self.client=APIClient()
+        self.user=create_user(email='user@example.com',password='testpass123')
+        self.client.force_authenticate(self.user)
+        self.recipie=create_recipie(user=self.user)
+        
+    def test_list_not_modified(self):
+        """Test a matching If-None-Match gives 304 without queries"""
+        res=self.client.get(RECIPIES_URL)
+        etag=res['ETag']
+        self.assertTrue(etag.startswith('"'))
+        
+        with self.assertNumQueries(0):
+            res=self.client.get(RECIPIES_URL,HTTP_IF_NONE_MATCH=etag)
+            
+        self.assertEqual(res.status_code,status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'],etag)
+        self.assertEqual(res.content,b'')
+        
+    def test_list_etag_changes_after_write(self):
+        """Test the ETag no longer matches once the user changes data"""
+        etag=self.client.get(RECIPIES_URL)['ETag']
+        self.recipie.tags.add(Tag.objects.create(user=self.user,name='Dinner'))
+        
+        res=self.client.get(RECIPIES_URL,HTTP_IF_NONE_MATCH=etag)
+        
+        self.assertEqual(res.status_code,status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'],etag)
+        
+    def test_etag_depends_on_query(self):
+        """Test filtered lists and details get their own ETags"""
+        etag=self.client.get(RECIPIES_URL)['ETag']
+        res=self.client.get(RECIPIES_URL,{'tags':'1'},HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code,status.HTTP_200_OK)
+        res=self.client.get(detail_url(self.recipie.id),HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code,status.HTTP_200_OK)
+        
+    def test_detail_etag_and_last_modified(self):
+        """Test recipie details answer both conditional headers"""
+        url=detail_url(self.recipie.id)
+        res=self.client.get(url)
+        self.assertIn('Last-Modified',res)
+        
+        res=self.client.get(url,HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code,status.HTTP_304_NOT_MODIFIED)
+        
+        last_modified=self.client.get(url)['Last-Modified']
+        res=self.client.get(url,HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(res.status_code,status.HTTP_304_NOT_MODIFIED)
+        
+    def test_update_sets_updated_at(self):
+        """Test updates move updated_at forward, also in bulk"""
+        before=self.recipie.updated_at
+        self.client.patch(detail_url(self.recipie.id),{'title':'New'})
+        self.recipie.refresh_from_db()
+        self.assertGreater(self.recipie.updated_at,before)
+        
+        before=self.recipie.updated_at
+        payload=[{'action':'update','id':self.recipie.id,'data':{'title':'Bulk'}}]
+        self.client.post(BULK_URL,payload,format='json')
+        self.recipie.refresh_from_db()
+        self.assertGreater(self.recipie.updated_at,before)
+        
+class RecipieSparseFieldsTests(TestCase):
+    """Test ?fields= and ?omit= on recipie endpoints"""
+    def setUp(self):
+        self.client=APIClient()
+        self.user=create_user(email='user@example.com',password='testpass123')
+        self.client.force_authenticate(self.user)
+        self.recipie=create_recipie(user=self.user,title='Curry')
+        self.recipie.tags.add(Tag.objects.create(user=self.user,name='Dinner'))
+        
+    def test_list_only_requested_fields(self):
+        """Test the list renders and loads only the requested fields"""
+        with CaptureQueriesContext(connection) as ctx:
+            res=self.client.get(RECIPIES_URL,{'fields':'id,title'})
+            
+        self.assertEqual(res.data,[{'id':self.recipie.id,'title':'Curry'}])
+        self.assertEqual(len(ctx.captured_queries),1)
+        self.assertNotIn('"price"',ctx.captured_queries[0]['sql'])
+        
+    def test_list_omit_fields(self):
+        """Test omitted relations are neither rendered nor prefetched"""
+        with CaptureQueriesContext(connection) as ctx:
+            res=self.client.get(RECIPIES_URL,{'omit':'tags,ingredients,link,thumbnail'})
+            
+        self.assertEqual(
+            list(res.data[0].keys()),
+            ['id','title','time_minutes','price']
+        )
+        self.assertEqual(len(ctx.captured_queries),1)
+        
+    def test_detail_fields(self):
+        """Test trimming the detail response"""
+        res=self.client.get(detail_url(self.recipie.id),{'fields':'id,description,tags'})
+        
+        self.assertEqual(res.status_code,status.HTTP_200_OK)
+        self.assertEqual(list(res.data.keys()),['id','tags','description'])
+        self.assertEqual(res.data['tags'][0]['name'],'Dinner')
+        
+    def test_fields_ignored_on_write(self):
+        """Test ?fields= does not drop fields from a write"""
+        payload={'title':'Soup','time_minutes':5,'price':'1.00'}
+        res=self.client.post(RECIPIES_URL+'?fields=id',payload)
+        self.assertEqual(res.status_code,status.HTTP_201_CREATED)
+        self.assertEqual(Recipie.objects.get(id=res.data['id']).title,'Soup')
+        
+class RecipieListReaderTests(TestCase):
+    """Test the fast path for listing recipies"""
+    def setUp(self):
+        self.client=APIClient()
+        self.user=create_user(email='user@example.com',password='testpass123')
+        self.client.force_authenticate(self.user)
+        tags=[Tag.objects.create(user=self.user,name=f'Tag {i}') for i in range(3)]
+        ingredient=Ingredient.objects.create(user=self.user,name='Salt')
+        for i in range(4):
+            recipie=create_recipie(
+                user=self.user,
+                title=f'Recipie "{i}" \u00e9',
+                price=Decimal('5.5'),
+                link='' if i else 'https://example.com',
+            )
+            recipie.tags.add(*tags[i%3:])
+            if i%2:
+                recipie.ingredients.add(ingredient)
+                
+    def test_reader_matches_serializer_bytes(self):
+        """Test the reader renders the same JSON as RecipieSerializer"""
+        queryset=Recipie.objects.filter(user=self.user).order_by('-id').prefetch_related(
+            Prefetch('tags',queryset=Tag.objects.order_by('id')),
+            Prefetch('ingredients',queryset=Ingredient.objects.order_by('id')),
+        )
+        reader=RecipieListReader()
+        
+        fast=reader.render(reader.values(queryset))
+        slow=RecipieSerializer(queryset,many=True).data
+        
+        self.assertEqual(JSONRenderer().render(fast),JSONRenderer().render(slow))
+        
+    def test_fast_list_endpoint_matches(self):
+        """Test the list endpoint gives the same bytes with the fast path on"""
+        for params in ({},{'tags':Tag.objects.first().id},{'omit':'tags'},{'page_size':3}):
+            with CaptureQueriesContext(connection) as slow_queries:
+                slow=self.client.get(RECIPIES_URL,params)
+            Recipie.objects.first().save()
+            with self.settings(RECIPIE_FAST_LIST=True):
+                with CaptureQueriesContext(connection) as fast_queries:
+                    fast=self.client.get(RECIPIES_URL,params)
+            self.assertEqual(fast.status_code,status.HTTP_200_OK)
+            self.assertEqual(fast.content,slow.content)
+            self.assertEqual(len(fast_queries),len(slow_queries))
+            
+    def test_fast_list_follows_cursor(self):
+        """Test the fast path pages with the same cursors"""
+        with self.settings(RECIPIE_FAST_LIST=True):
+            res=self.client.get(RECIPIES_URL,{'page_size':3})
+            res=self.client.get(res.data['next'])
+        self.assertEqual(len(res.data['results']),1)
+        
+class RecipieFragmentCacheTests(TestCase):
+    """Test assembling recipie responses from cached fragments"""
+    def setUp(self):
+        cache.clear()
+        self.client=APIClient()
+        self.user=create_user(email='user@example.com',password='testpass123')
+        self.client.force_authenticate(self.user)
+        self.tag=Tag.objects.create(user=self.user,name='Dinner')
+        self.recipies=[create_recipie(user=self.user,title=f'Recipie {i}') for i in range(3)]
+        self.recipies[0].tags.add(self.tag)
+        
+    def get(self,url,params=None):
+        """GET url with fragments on, bypassing the response cache"""
+        bump_generation(self.user.pk)
+        with self.settings(RECIPIE_FRAGMENT_CACHE=True):
+            return self.client.get(url,params)
+        
+    def test_fragments_match_serializer(self):
+        """Test fragment responses equal the regular ones"""
+        for url,params in ((RECIPIES_URL,{}),(RECIPIES_URL,{'fields':'id,tags'}),
+                           (RECIPIES_URL,{'page_size':2}),(detail_url(self.recipies[0].id),{})):
+            slow=self.client.get(url,params)
+            cache.clear()
+            fast=self.get(url,params)
+            self.assertEqual(fast.status_code,status.HTTP_200_OK)
+            self.assertEqual(fast.content,slow.content)
+            
+    def test_cached_fragments_skip_rendering(self):
+        """Test a warm list needs only the id and updated_at query"""
+        self.get(RECIPIES_URL)
+        with CaptureQueriesContext(connection) as ctx:
+            res=self.get(RECIPIES_URL)
+        self.assertEqual(len(res.data),3)
+        self.assertEqual(len(ctx.captured_queries),1)
+        
+    def test_tag_rename_refreshes_only_linked_recipies(self):
+        """Test renaming a tag re-renders only the recipies using it"""
+        self.get(RECIPIES_URL)
+        self.tag.name='Supper'
+        self.tag.save()
+        
+        with CaptureQueriesContext(connection) as ctx:
+            res=self.get(RECIPIES_URL)
+            
+        recipie=next(item for item in res.data if item['id']==self.recipies[0].id)
+        self.assertEqual(recipie['tags'][0]['name'],'Supper')
+        rendered=[query['sql'] for query in ctx.captured_queries if 'IN (' in query['sql']]
+        self.assertIn(f'IN ({self.recipies[0].id})',rendered[0])
+        
+    def test_link_change_refreshes_fragment(self):
+        """Test adding and clearing links retires the recipie fragment"""
+        self.get(detail_url(self.recipies[1].id))
+        self.tag.recipie_set.add(self.recipies[1])
+        res=self.get(detail_url(self.recipies[1].id))
+        self.assertEqual(res.data['tags'][0]['name'],'Dinner')
+        
+        self.tag.recipie_set.clear()
+        res=self.get(detail_url(self.recipies[1].id))
+        self.assertEqual(res.data['tags'],[])
+        
 class ImageUploadTests(TestCase):
     """Tests for the image upload API."""
     def setUp(self):
@@ -411,9 +1116,14 @@ class ImageUploadTests(TestCase):
         )
         self.client.force_authenticate(self.user)
         self.recipie=create_recipie(user=self.user)
+        # Stored images are shared by hash and never deleted with a row
+        self.media_root=tempfile.mkdtemp()
+        self.media=override_settings(MEDIA_ROOT=self.media_root)
+        self.media.enable()
         
     def tearDown(self): #this runs AFTER test runs
-        self.recipie.image.delete()
+        self.media.disable()
+        shutil.rmtree(self.media_root)
         
     def test_upload_image(self):
         """Test uploading image to a recipie"""
@@ -437,6 +1147,158 @@ class ImageUploadTests(TestCase):
         res=self.client.post(url,payload,format='multipart')
         self.assertEqual(res.status_code,status.HTTP_400_BAD_REQUEST)
         
+    def post_file(self,content,suffix='.jpg'):
+        """Upload raw bytes as the recipie image"""
+        url=image_upload_url(self.recipie.id)
+        with tempfile.NamedTemporaryFile(suffix=suffix) as image_file:
+            image_file.write(content)
+            image_file.seek(0)
+            return self.client.post(url,{'image':image_file},format='multipart')
+        
+    def test_upload_over_byte_limit(self):
+        """Test files over the byte limit are rejected while streaming"""
+        content=os.urandom(5000)
+        with self.settings(IMAGE_MAX_BYTES=1000):
+            with patch('recipie.uploads.LimitedUploadHandler.receive_data_chunk',
+                       autospec=True,
+                       side_effect=LimitedUploadHandler.receive_data_chunk) as receive:
+                res=self.post_file(content)
+                
+        self.assertEqual(res.status_code,status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        receive.assert_called()
+        self.recipie.refresh_from_db()
+        self.assertFalse(self.recipie.image)
+        
+    def test_upload_rejected_from_content_length(self):
+        """Test bodies that cannot fit the limit are rejected unread"""
+        with self.settings(IMAGE_MAX_BYTES=1000):
+            with patch('recipie.uploads.LimitedUploadHandler.receive_data_chunk') as receive:
+                res=self.post_file(os.urandom(200*2**10))
+                
+        self.assertEqual(res.status_code,status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        receive.assert_not_called()
+        
+    def test_upload_over_pixel_limit(self):
+        """Test the pixel limit is checked from the header"""
+        image_file=tempfile.SpooledTemporaryFile()
+        Image.new('RGB',(100,100)).save(image_file,format='PNG')
+        image_file.seek(0)
+        with self.settings(IMAGE_MAX_PIXELS=5000):
+            with patch('PIL.ImageFile.ImageFile.load') as load:
+                res=self.post_file(image_file.read(),suffix='.png')
+                
+        self.assertEqual(res.status_code,status.HTTP_400_BAD_REQUEST)
+        self.assertIn('pixels',res.data['image'][0])
+        load.assert_not_called()
+        
+    def test_upload_truncated_jpeg(self):
+        """Test corrupt JPEG data is caught by the reduced decode"""
+        image_file=tempfile.SpooledTemporaryFile()
+        Image.effect_noise((400,400),50).convert('RGB').save(image_file,format='JPEG')
+        image_file.seek(0)
+        
+        res=self.post_file(image_file.read()[:2000])
+        
+        self.assertEqual(res.status_code,status.HTTP_400_BAD_REQUEST)
+        
+    def test_check_image_decodes_jpeg_in_draft_mode(self):
+        """Test JPEG validation decodes at reduced scale"""
+        image_file=tempfile.SpooledTemporaryFile()
+        Image.new('RGB',(800,800)).save(image_file,format='JPEG')
+        with patch('PIL.JpegImagePlugin.JpegImageFile.draft',autospec=True,
+                   side_effect=JpegImageFile.draft) as draft:
+            check_image(image_file)
+        self.assertEqual(draft.call_args.args[2],(100,100))
+        self.assertEqual(image_file.tell(),0)
+        
+    def upload(self,size=(2000,1000),exif=None):
+        """Upload a JPEG with derivatives rendered in process"""
+        url=image_upload_url(self.recipie.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            img=Image.new('RGB',size,'red')
+            img.save(image_file,format='JPEG',exif=exif or Image.Exif())
+            image_file.seek(0)
+            with self.settings(IMAGE_WORKERS=0):
+                with self.captureOnCommitCallbacks(execute=True):
+                    res=self.client.post(url,{'image':image_file},format='multipart')
+        self.assertEqual(res.status_code,status.HTTP_200_OK)
+        self.recipie.refresh_from_db()
+        return res
+        
+    def test_identical_uploads_share_file(self):
+        """Test the same image uploaded to two recipies is stored once"""
+        other=create_recipie(user=self.user)
+        image_file=tempfile.SpooledTemporaryFile()
+        Image.new('RGB',(10,10),'blue').save(image_file,format='JPEG')
+        image_file.seek(0)
+        content=image_file.read()
+        
+        self.post_file(content)
+        self.recipie,first=other,self.recipie
+        self.post_file(content)
+        
+        first.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(first.image.name,other.image.name)
+        self.assertTrue(is_content_addressed(other.image.name))
+        
+    def test_upload_renders_derivatives(self):
+        """Test uploads get resized JPEG and WebP derivatives"""
+        res=self.upload()
+        
+        self.assertEqual(res.data['images'],{})
+        derivatives=self.recipie.image_derivatives
+        self.assertEqual(
+            set(derivatives),
+            {'thumb','medium','large','thumb_webp','medium_webp','large_webp'},
+        )
+        for name,size in (('thumb',150),('medium',600),('large',1200)):
+            with Image.open(default_storage.path(derivatives[name])) as img:
+                self.assertEqual(img.size,(size,size//2))
+            with Image.open(default_storage.path(derivatives[f'{name}_webp'])) as img:
+                self.assertEqual(img.format,'WEBP')
+                
+    def test_derivatives_strip_exif(self):
+        """Test derivatives apply the orientation and drop EXIF"""
+        exif=Image.Exif()
+        exif[0x0112]=6
+        exif[0x010f]='Camera'
+        self.upload(size=(400,200),exif=exif)
+        
+        with Image.open(default_storage.path(self.recipie.image_derivatives['thumb'])) as img:
+            self.assertEqual(img.size,(75,150))
+            self.assertEqual(dict(img.getexif()),{})
+            
+    def test_derivative_urls_exposed(self):
+        """Test list and detail expose derivative URLs once ready"""
+        res=self.client.get(RECIPIES_URL)
+        self.assertIsNone(res.data[0]['thumbnail'])
+        
+        self.upload()
+        
+        res=self.client.get(RECIPIES_URL)
+        self.assertEqual(
+            res.data[0]['thumbnail'],
+            default_storage.url(self.recipie.image_derivatives['thumb']),
+        )
+        res=self.client.get(detail_url(self.recipie.id))
+        self.assertEqual(set(res.data['images']),set(self.recipie.image_derivatives))
+        
+    def test_new_upload_resets_derivatives(self):
+        """Test derivatives of a replaced image are not kept"""
+        self.upload()
+        old=self.recipie.image_derivatives
+        
+        url=image_upload_url(self.recipie.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB',(10,10)).save(image_file,format='JPEG')
+            image_file.seek(0)
+            self.client.post(url,{'image':image_file},format='multipart')
+        store_derivatives(self.recipie.id,self.user.id,'uploads/recipie/old.jpg',old)
+        
+        self.recipie.refresh_from_db()
+        self.assertEqual(self.recipie.image_derivatives,{})
+        
             
     
         
@@ -75,6 +75,29 @@ class PrivateTagsApiTest(TestCase):
         
         self.assertEqual(tag.name,payload['name'])
         
+    def test_rename_tag_to_existing_name_fails(self):
+        """Test renaming a tag to a name the user already has"""
+        Tag.objects.create(user=self.user,name='Lunch')
+        tag=Tag.objects.create(user=self.user,name='Dinner')
+        
+        res=self.client.patch(detail_url(tag.id),{'name':'Lunch'})
+        
+        self.assertEqual(res.status_code,status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name,'Dinner')
+        
+    def test_update_tag_invalidates_cached_list(self):
+        """Test the cached tag list is refreshed after a rename"""
+        tag=Tag.objects.create(user=self.user,name='Lunch')
+        self.client.get(TAGS_URL)
+        with self.assertNumQueries(0):
+            self.client.get(TAGS_URL)
+            
+        self.client.patch(detail_url(tag.id),{'name':'Brunch'})
+        res=self.client.get(TAGS_URL)
+        
+        self.assertEqual(res.data[0]['name'],'Brunch')
+        
     def test_delete_tag(self):
         """Test deleting a tag"""
         tag=Tag.objects.create(user=self.user,name='breakfast')
@@ -125,4 +148,39 @@ class PrivateTagsApiTest(TestCase):
         res=self.client.get(TAGS_URL,{'assigned_only':1})
         
         self.assertEqual(len(res.data),1)
-        
\ No newline at end of file
+                
+    def test_paginate_tags_by_name(self):
+        """Test walking tag pages forward and back on (name, id)"""
+        for name in ['Apple','Banana','Cherry','Date','Elderberry']:
+            Tag.objects.create(user=self.user,name=name)
+        expected=list(
+            Tag.objects.order_by('-name','-id').values_list('id',flat=True)
+        )
+        
+        res=self.client.get(TAGS_URL,{'page_size':2})
+        self.assertEqual(res.status_code,status.HTTP_200_OK)
+        self.assertIsNone(res.data['previous'])
+        ids=[t['id'] for t in res.data['results']]
+        while res.data['next']:
+            res=self.client.get(res.data['next'])
+            ids+=[t['id'] for t in res.data['results']]
+        self.assertEqual(ids,expected)
+        
+        res=self.client.get(res.data['previous'])
+        self.assertEqual([t['id'] for t in res.data['results']],expected[2:4])
+        
+    def test_invalid_cursor_returns_not_found(self):
+        """Test a malformed cursor is rejected"""
+        res=self.client.get(TAGS_URL,{'cursor':'bm90YWN1cnNvcg=='})
+        self.assertEqual(res.status_code,status.HTTP_404_NOT_FOUND)
+        
+    def test_filter_tags_starts_with(self):
+        """Test seeking tags by name prefix"""
+        t1=Tag.objects.create(user=self.user,name='Breakfast')
+        t2=Tag.objects.create(user=self.user,name='Brunch')
+        Tag.objects.create(user=self.user,name='Dinner')
+        
+        res=self.client.get(TAGS_URL,{'starts_with':'Br'})
+        
+        self.assertEqual(res.status_code,status.HTTP_200_OK)
+        self.assertEqual([t['id'] for t in res.data],[t2.id,t1.id])
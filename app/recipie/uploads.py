@@ -0,0 +1,56 @@
+"""Memory-bounded handling of recipie image uploads"""
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadhandler import SkipFile,TemporaryFileUploadHandler
+from PIL import Image
+
+# Allowance for multipart boundaries and headers around the file itself
+MULTIPART_OVERHEAD=64*2**10
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Stream uploaded files to disk in chunks, skipping any over max_bytes"""
+    
+    def __init__(self,max_bytes,request=None):
+        super().__init__(request)
+        self.max_bytes=max_bytes
+        self.exceeded=False
+        
+    def receive_data_chunk(self,raw_data,start):
+        if start+len(raw_data)>self.max_bytes:
+            self.exceeded=True
+            raise SkipFile
+        return super().receive_data_chunk(raw_data,start)
+    
+    
+def content_too_large(request):
+    """Return True if the declared body cannot hold an allowed image"""
+    try:
+        length=int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return False
+    return length>settings.IMAGE_MAX_BYTES+MULTIPART_OVERHEAD
+
+def check_image(file):
+    """Reject images over the pixel limit or with corrupt data.
+
+    The size comes from the header, before any pixels are decoded. JPEG
+    data is then decoded at 1/8 scale with draft(), which is enough to
+    catch truncated or corrupt files at a fraction of the memory.
+    """
+    file.seek(0)
+    try:
+        with Image.open(file) as img:
+            width,height=img.size
+            if width*height>settings.IMAGE_MAX_PIXELS:
+                raise ValidationError(
+                    f'Image has {width}x{height} pixels, '
+                    f'the limit is {settings.IMAGE_MAX_PIXELS} pixels.'
+                )
+            if img.format=='JPEG':
+                img.draft('L',(max(width//8,1),max(height//8,1)))
+                img.load()
+    except (OSError,SyntaxError,Image.DecompressionBombError):
+        raise ValidationError('Image data is corrupt.')
+    finally:
+        file.seek(0)
@@ -1,9 +1,11 @@
 """URL mappings for the recipie APP"""
+from django.conf import settings
 from django.urls import path,include 
 from rest_framework.routers import DefaultRouter
 from recipie import views 
+from recipie.async_views import AsyncReadRouter
 
-router=DefaultRouter()
+router=AsyncReadRouter() if settings.RECIPIE_ASYNC_VIEWS else DefaultRouter()
 router.register('recipies',views.RecipieViewSet)
 router.register('tags',views.TagViewSet)
 router.register('ingredients',views.IngredientViewSet)
@@ -1,4 +1,7 @@
 """Views for recipie APIs"""
+import json
+from itertools import islice
+from asgiref.sync import sync_to_async
 from drf_spectacular.utils import (
     extend_schema_view,
     extend_schema,
@@ -12,14 +15,43 @@ from rest_framework import (
     )
 from rest_framework.decorators import action 
 from rest_framework.response import Response 
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.utils.encoders import JSONEncoder
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.db.models import Exists,OuterRef,Prefetch
 from core.models import (
     Recipie,
     Tag,
     Ingredient
     )
+from user.authentication import CachedTokenAuthentication,SignedTokenAuthentication
 from . import serializers
+from .async_views import AsyncReadMixin
+from .cache import CachedListMixin,ConditionalGetMixin,FragmentCacheMixin
+from .images import enqueue_derivatives
+from .importer import RecipieImporter
+from .pagination import RecipieCursorPagination,NameKeysetPagination
+from .parsers import NDJSONParser
+from .readers import RecipieListReader
+from .uploads import LimitedUploadHandler,content_too_large
+
+class FastListMixin:
+    """List recipies through RecipieListReader when RECIPIE_FAST_LIST is on"""
+    
+    def list(self,request,*args,**kwargs):
+        if not getattr(settings,'RECIPIE_FAST_LIST',False):
+            return super().list(request,*args,**kwargs)
+        reader=RecipieListReader(self.get_serializer_context())
+        queryset=reader.values(self.filter_queryset(self.get_queryset()))
+        page=self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(reader.render(page))
+        return Response(reader.render(queryset))
 
 @extend_schema_view(
     list=extend_schema(
@@ -33,16 +65,31 @@ from . import serializers
                 'ingredients',
                 OpenApiTypes.STR,
                 description='Comma separated list of ingredient IDs to filter',
-            )
+            ),
+            OpenApiParameter(
+                'match',
+                OpenApiTypes.STR,
+                enum=['any','all'],
+                description='Match recipies with any (default) or all of the IDs',
+            ),
+            *serializers.SPARSE_FIELDS_PARAMETERS,
         ]
-    )
+    ),
+    retrieve=extend_schema(parameters=serializers.SPARSE_FIELDS_PARAMETERS),
 )
-class RecipieViewSet(viewsets.ModelViewSet):
+class RecipieViewSet(ConditionalGetMixin,
+                     CachedListMixin,
+                     FragmentCacheMixin,
+                     FastListMixin,
+                     AsyncReadMixin,
+                     viewsets.ModelViewSet):
     """View for manage recipie APIs"""
     serializer_class=serializers.RecipieDetailSerializer
     queryset=Recipie.objects.all()
-    authentication_classes=[TokenAuthentication]
+    authentication_classes=[SignedTokenAuthentication,CachedTokenAuthentication]
     permission_classes=[IsAuthenticated]
+    pagination_class=RecipieCursorPagination
+    export_chunk_size=500
     
     def _params_to_ints(self,qs):
         """Convert a list of strings to integers."""
@@ -52,14 +99,55 @@ class RecipieViewSet(viewsets.ModelViewSet):
         """Retrieve recipies for authenticated user."""
         tags=self.request.query_params.get('tags')
         ingredients=self.request.query_params.get('ingredients')
+        match_all=self.request.query_params.get('match')=='all'
         queryset=self.queryset
         if tags:
             tag_ids=self._params_to_ints(tags)
-            queryset=queryset.filter(tags__id__in=tag_ids)
+            queryset=self._filter_linked(queryset,'tags',tag_ids,match_all)
         if ingredients:
             ingredient_ids=self._params_to_ints(ingredients)
-            queryset=queryset.filter(ingredients__id__in=ingredient_ids)
-        return queryset.filter(user=self.request.user).order_by('-id').distinct()
+            queryset=self._filter_linked(queryset,'ingredients',ingredient_ids,match_all)
+        queryset=queryset.filter(user=self.request.user).order_by('-id')
+        return self._apply_query_plan(queryset)
+    
+    def _filter_linked(self,queryset,field,ids,match_all):
+        """Keep recipies linked to any or all of ids, using EXISTS subqueries"""
+        through=getattr(Recipie,field).through
+        column=through._meta.get_field(serializers.ATTR_MODELS[field]._meta.model_name).attname
+        links=through.objects.filter(recipie_id=OuterRef('pk'))
+        if match_all:
+            for pk in set(ids):
+                queryset=queryset.filter(Exists(links.filter(**{column:pk})))
+            return queryset
+        return queryset.filter(Exists(links.filter(**{f'{column}__in':ids})))
+    
+    def _apply_query_plan(self,queryset):
+        """Prefetch relations and load only the columns the action renders"""
+        if self.action not in ('list','retrieve','export'):
+            return queryset
+        if self.use_fragments():
+            return queryset.only('id','updated_at')
+        fields=serializers.sparse_fields(
+            self.request,
+            self.get_serializer_class().Meta.fields,
+        )
+        return self._load_fields(queryset,fields)
+    
+    def _load_fields(self,queryset,fields):
+        """Prefetch the relations in fields and load only its columns"""
+        for field,model in serializers.ATTR_MODELS.items():
+            if field in fields:
+                queryset=queryset.prefetch_related(
+                    Prefetch(field,queryset=model.objects.only('id','name').order_by('id'))
+                )
+        return queryset.only('id','updated_at',*serializers.model_columns(fields))
+    
+    def get_fragment_queryset(self,ids):
+        """Return the recipies to render into fragments with every field loaded"""
+        return self._load_fields(
+            Recipie.objects.filter(id__in=ids),
+            self.get_serializer_class().Meta.fields,
+        )
     
     def get_serializer_class(self):
         """Return the serializer class for request"""
@@ -69,17 +157,213 @@ class RecipieViewSet(viewsets.ModelViewSet):
             return serializers.RecipieImageSerializer
         return self.serializer_class
     
+    def retrieve(self,request,*args,**kwargs):
+        """Retrieve a recipie, answering conditional requests before serializing"""
+        return self.conditional_response(self._retrieve,request,*args,**kwargs)
+    
+    async def aretrieve(self,request,*args,**kwargs):
+        return await self.aconditional_response(self._aretrieve,request,*args,**kwargs)
+    
+    def async_supported(self):
+        """Leave the fast list and fragment modes to the sync actions"""
+        return not (settings.RECIPIE_FAST_LIST or self.use_fragments())
+    
+    def _retrieve(self,request,*args,**kwargs):
+        return self._detail_response(request,self.get_object())
+    
+    async def _aretrieve(self,request,*args,**kwargs):
+        return self._detail_response(request,await self.aget_object())
+    
+    def _detail_response(self,request,instance):
+        """Return the detail of instance, or 304 if it is not modified since"""
+        last_modified=int(instance.updated_at.timestamp())
+        not_modified=get_conditional_response(request,last_modified=last_modified)
+        if not_modified is None and self.use_fragments():
+            response=Response(self.render_fragments([instance])[0])
+        elif not_modified is None:
+            response=Response(self.get_serializer(instance).data)
+        else:
+            response=not_modified
+        response['Last-Modified']=http_date(last_modified)
+        return response
+        
     def perform_create(self,serializer):
         """Create a new recipie"""
         serializer.save(user=self.request.user)
         
+    @extend_schema(
+        request=serializers.RecipieBulkOperationSerializer(many=True),
+        responses=serializers.RecipieBulkResultSerializer(many=True),
+    )
+    @action(methods=['POST'],detail=False,url_path='bulk')
+    def bulk(self,request):
+        """Create, update and delete many recipies in one transaction"""
+        operations=serializers.RecipieBulkOperationSerializer(
+            data=request.data,
+            many=True,
+        )
+        operations.is_valid(raise_exception=True)
+        ids=[op['id'] for op in operations.validated_data if 'id' in op]
+        instances={
+            recipie.id:recipie
+            for recipie in self.get_queryset().filter(id__in=ids)
+        }
+        
+        results,creates,updates,deletes=[],[],[],[]
+        for index,op in enumerate(operations.validated_data):
+            result={'index':index,'action':op['action'],'id':op.get('id')}
+            results.append(result)
+            if op['action']=='create':
+                creates.append((result,op['data']))
+            elif op['id'] not in instances:
+                result['status']='not_found'
+            elif op['action']=='update':
+                updates.append((result,instances[op['id']],op['data']))
+            else:
+                deletes.append((result,op['id']))
+                
+        context=self.get_serializer_context()
+        serializer_class=self.get_serializer_class()
+        create_serializer=serializer_class(
+            data=[data for _,data in creates],
+            many=True,
+            context=context,
+        )
+        update_serializer=serializer_class(
+            [instance for _,instance,_ in updates],
+            data=[data for _,_,data in updates],
+            many=True,
+            partial=True,
+            context=context,
+        )
+        invalid=False
+        for items,serializer in ((creates,create_serializer),(updates,update_serializer)):
+            if serializer.is_valid():
+                continue
+            invalid=True
+            errors=serializer.errors
+            if isinstance(errors,dict):
+                errors=[errors.get(i,{}) for i in range(len(items))]
+            for (result,*_),item_errors in zip(items,errors):
+                if item_errors:
+                    result['status']='invalid'
+                    result['errors']=item_errors
+        if invalid:
+            return Response(results,status=status.HTTP_400_BAD_REQUEST)
+        
+        with transaction.atomic():
+            context['resolved_attrs']=serializers.resolve_batch_attrs(
+                request.user,
+                create_serializer.validated_data+update_serializer.validated_data,
+            )
+            if creates:
+                created=create_serializer.save(user=request.user)
+                for (result,_),recipie in zip(creates,created):
+                    result['id']=recipie.id
+                    result['status']='created'
+            if updates:
+                update_serializer.save()
+                for result,*_ in updates:
+                    result['status']='updated'
+            if deletes:
+                Recipie.objects.filter(id__in=[pk for _,pk in deletes]).delete()
+                for result,_ in deletes:
+                    result['status']='deleted'
+        return Response(results,status=status.HTTP_200_OK)
+        
+    @extend_schema(
+        request={'application/x-ndjson':OpenApiTypes.STR},
+        responses=OpenApiTypes.OBJECT,
+    )
+    @action(
+        methods=['POST'],
+        detail=False,
+        url_path='import',
+        parser_classes=[NDJSONParser],
+    )
+    def import_recipies(self,request):
+        """Import recipies streamed as NDJSON, one recipie per line"""
+        importer=RecipieImporter(request.user)
+        stream=request.stream
+        lines=iter(stream.readline,b'') if stream is not None else []
+        stats=importer.run(lines)
+        return Response(stats,status=status.HTTP_200_OK)
+        
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'stream_format',
+                OpenApiTypes.STR,
+                enum=['json','ndjson'],
+                description='Export as a JSON array (default) or NDJSON.',
+            )
+        ],
+        responses=serializers.RecipieDetailSerializer(many=True),
+    )
+    @action(methods=['GET'],detail=False,url_path='export')
+    def export(self,request):
+        """Stream every recipie of the user as JSON or NDJSON"""
+        stream_format=request.query_params.get('stream_format','json')
+        if stream_format not in ('json','ndjson'):
+            return Response(
+                {'stream_format':'Must be json or ndjson.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        rows=self._export_rows(self.get_queryset())
+        if stream_format=='ndjson':
+            content=(row+'\n' for row in rows)
+            content_type='application/x-ndjson'
+        else:
+            content=self._json_array(rows)
+            content_type='application/json'
+        if isinstance(request._request,ASGIRequest):
+            # Django buffers a sync iterator whole under ASGI
+            content=self._aiter_content(content)
+        response=StreamingHttpResponse(content,content_type=content_type)
+        response['Content-Disposition']=f'attachment; filename="recipies.{stream_format}"'
+        return response
+    
+    def _export_rows(self,queryset):
+        """Yield recipies as JSON strings, fetched through a server side cursor"""
+        serializer=self.get_serializer()
+        for recipie in queryset.iterator(chunk_size=self.export_chunk_size):
+            yield json.dumps(serializer.to_representation(recipie),cls=JSONEncoder)
+            
+    async def _aiter_content(self,content):
+        """Yield content asynchronously, reading a chunk of rows at a time"""
+        next_chunk=sync_to_async(lambda:list(islice(content,self.export_chunk_size)))
+        while chunk:=await next_chunk():
+            for part in chunk:
+                yield part
+                
+    def _json_array(self,rows):
+        """Wrap JSON rows into a single JSON array"""
+        yield '['
+        for index,row in enumerate(rows):
+            yield row if index==0 else ','+row
+        yield ']'
+        
+    def _image_too_large(self):
+        message=f'Image is larger than {settings.IMAGE_MAX_BYTES} bytes.'
+        return Response(
+            {'image':[message]},
+            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        )
+        
     @action(methods=['POST'],detail=True,url_path='upload-image')
     def upload_image(self,request,pk=None):
         """Upload an image to recipie"""
         recipie=self.get_object()
+        if content_too_large(request):
+            return self._image_too_large()
+        handler=LimitedUploadHandler(settings.IMAGE_MAX_BYTES,request._request)
+        request._request.upload_handlers=[handler]
         serializer=self.get_serializer(recipie,data=request.data)
+        if handler.exceeded:
+            return self._image_too_large()
         if serializer.is_valid():
-            serializer.save()
+            recipie=serializer.save(image_derivatives={})
+            enqueue_derivatives(recipie)
             return Response(serializer.data,status=status.HTTP_200_OK)
         return Response(serializer.errors,status=status.HTTP_400_BAD_REQUEST)
 
@@ -90,26 +374,39 @@ class RecipieViewSet(viewsets.ModelViewSet):
                 'assigned_only',
                 OpenApiTypes.INT,enum=[0,1],
                 description='Filter by items assigned to recipies.',
-            )
+            ),
+            OpenApiParameter(
+                'starts_with',
+                OpenApiTypes.STR,
+                description='Case sensitive name prefix to seek to.',
+            ),
         ]
     )
 )      
-class BaseRecipieAttrViewSet(mixins.UpdateModelMixin,
+class BaseRecipieAttrViewSet(ConditionalGetMixin,
+                             CachedListMixin,
+                             mixins.UpdateModelMixin,
                              mixins.DestroyModelMixin,
                              mixins.ListModelMixin,
+                             AsyncReadMixin,
                              viewsets.GenericViewSet):
     """Base viewset for recipie attributes"""
-    authentication_classes=[TokenAuthentication]
+    authentication_classes=[SignedTokenAuthentication,CachedTokenAuthentication]
     permission_classes=[IsAuthenticated]
+    pagination_class=NameKeysetPagination
+    
     def get_queryset(self):
         """Filter queryset to authenticated user"""
         assigned_only=bool(
             int(self.request.query_params.get('assigned_only',0))
         )
+        starts_with=self.request.query_params.get('starts_with')
         queryset=self.queryset 
         if assigned_only:
             queryset=queryset.filter(recipie__isnull=False)
-        return queryset.filter(user=self.request.user).order_by('-name').distinct()
+        if starts_with:
+            queryset=queryset.filter(name__startswith=starts_with)
+        return queryset.filter(user=self.request.user).order_by('-name','-id').distinct()
     
 class TagViewSet(BaseRecipieAttrViewSet):
     """Manage tags in the database"""
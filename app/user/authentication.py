@@ -0,0 +1,170 @@
+"""Token authentication backed by an in-process LRU and the shared cache"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication,get_authorization_header
+from rest_framework.authtoken.models import Token
+from user.tokens import read_access_token,signed_tokens_enabled,user_from_claims
+
+
+class TokenCache:
+    """LRU of token digest to token owner, in front of the shared cache.
+
+    Entries are keyed by a SHA-256 digest of the token and hold the user's
+    fields without the password hash, so the cache holds no credentials.
+    Local entries live for local_ttl seconds, which bounds how long another
+    process can serve a token that was deleted or a user that was changed.
+    """
+    def __init__(self,maxsize=1024,local_ttl=30,shared_ttl=300):
+        self.maxsize=maxsize
+        self.local_ttl=local_ttl
+        self.shared_ttl=shared_ttl
+        self._entries=OrderedDict()
+        self._lock=threading.Lock()
+        self.reset_stats()
+        
+    def _digest(self,key):
+        return hashlib.sha256(key.encode()).hexdigest()
+    
+    def _shared_key(self,digest):
+        return f'user:token:{digest}'
+    
+    def get(self,key):
+        """Return the cached token for key with its user, or None"""
+        digest=self._digest(key)
+        entry=self._get_local(digest)
+        if entry is None:
+            entry=self._found_shared(digest,cache.get(self._shared_key(digest)))
+        return None if entry is None else self._token(key,entry)
+    
+    def _get_local(self,digest):
+        now=time.monotonic()
+        with self._lock:
+            entry=self._entries.get(digest)
+            if entry is not None and entry[0]>now:
+                self._entries.move_to_end(digest)
+                self.hits+=1
+                return entry[1]
+        return None
+    
+    def _found_shared(self,digest,entry):
+        with self._lock:
+            if entry is None:
+                self.misses+=1
+                return None
+            self.shared_hits+=1
+        self._remember(digest,entry)
+        return entry
+    
+    def _token(self,key,entry):
+        """Build the token and its user from a cache entry without queries"""
+        User=get_user_model()
+        user=User.from_db(router.db_for_read(User),list(entry['user']),list(entry['user'].values()))
+        token=Token.from_db(router.db_for_read(Token),['key','user_id','created'],[key,user.pk,entry['created']])
+        token.user=user
+        return token
+    
+    def set(self,key,token):
+        """Cache token, which must have its user loaded"""
+        entry={
+            'created':token.created,
+            'user':{
+                field.attname:getattr(token.user,field.attname)
+                for field in token.user._meta.concrete_fields if field.name!='password'
+            },
+        }
+        digest=self._digest(key)
+        cache.set(self._shared_key(digest),entry,self.shared_ttl)
+        self._remember(digest,entry)
+        
+    def _remember(self,digest,entry):
+        with self._lock:
+            self._entries[digest]=(time.monotonic()+self.local_ttl,entry)
+            self._entries.move_to_end(digest)
+            while len(self._entries)>self.maxsize:
+                self._entries.popitem(last=False)
+                
+    def invalidate(self,*keys):
+        """Forget the given token keys locally and in the shared cache"""
+        digests=[self._digest(key) for key in keys]
+        with self._lock:
+            for digest in digests:
+                self._entries.pop(digest,None)
+        cache.delete_many([self._shared_key(digest) for digest in digests])
+        
+    def clear(self):
+        """Forget every locally cached token"""
+        with self._lock:
+            self._entries.clear()
+            
+    def reset_stats(self):
+        self.hits=self.shared_hits=self.misses=0
+        
+    def stats(self):
+        """Return hit counters and the overall hit rate"""
+        with self._lock:
+            lookups=self.hits+self.shared_hits+self.misses
+            return {
+                'hits':self.hits,
+                'shared_hits':self.shared_hits,
+                'misses':self.misses,
+                'hit_rate':(self.hits+self.shared_hits)/lookups if lookups else 0.0,
+                'size':len(self._entries),
+            }
+        
+        
+token_cache=TokenCache(
+    maxsize=getattr(settings,'TOKEN_CACHE_SIZE',1024),
+    local_ttl=getattr(settings,'TOKEN_CACHE_LOCAL_TTL',30),
+    shared_ttl=getattr(settings,'TOKEN_CACHE_TTL',300),
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that skips the authtoken query on cache hits"""
+    
+    def authenticate_credentials(self,key):
+        token=token_cache.get(key)
+        if token is not None:
+            return (token.user,token)
+        user,token=super().authenticate_credentials(key)
+        token_cache.set(key,token)
+        return (user,token)
+    
+    
+class SignedTokenAuthentication(TokenAuthentication):
+    """Authenticate signed access tokens without touching the database.
+
+    Opaque tokens are left to the next authentication class.
+    """
+    
+    def authenticate(self,request):
+        if not signed_tokens_enabled():
+            return None
+        auth=get_authorization_header(request).split()
+        if len(auth)!=2 or auth[0].lower()!=self.keyword.lower().encode():
+            return None
+        try:
+            key=auth[1].decode()
+        except UnicodeError:
+            return None
+        if ':' not in key:
+            return None
+        return self.authenticate_credentials(key)
+    
+    def authenticate_credentials(self,key):
+        try:
+            claims=read_access_token(key)
+        except signing.SignatureExpired:
+            raise exceptions.AuthenticationFailed(_('Token has expired.'))
+        except signing.BadSignature:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        return (user_from_claims(claims),claims)
@@ -2,6 +2,7 @@
 from django.contrib.auth import get_user_model,authenticate
 from django.utils.translation import gettext as _
 from rest_framework import serializers
+from user.tokens import refresh_user
 
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for the user object"""
@@ -44,6 +45,17 @@ class AuthTokenSerializer(serializers.Serializer):
             msg=_('Unable to authenticate with provided credentials')
             raise serializers.ValidationError(msg,code='authorization')
         attrs['user']=user 
-        return attrs 
+        return attrs
+
+class TokenRefreshSerializer(serializers.Serializer):
+    """Serializer for refreshing signed tokens"""
+    refresh=serializers.CharField(trim_whitespace=False)
     
-    
\ No newline at end of file
+    def validate(self,attrs):
+        """Validate the refresh token and re-check its user"""
+        user=refresh_user(attrs['refresh'])
+        if not user:
+            msg=_('Refresh token is invalid or expired')
+            raise serializers.ValidationError(msg,code='authorization')
+        attrs['user']=user
+        return attrs
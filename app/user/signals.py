@@ -0,0 +1,20 @@
+"""Signal handlers keeping the token cache in sync with the database"""
+from django.conf import settings
+from django.db.models.signals import post_delete,post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from user.authentication import token_cache
+
+
+@receiver(post_delete,sender=Token)
+def forget_token(sender,instance,**kwargs):
+    """Drop a deleted token from the cache"""
+    token_cache.invalidate(instance.key)
+
+@receiver(post_save,sender=settings.AUTH_USER_MODEL)
+def forget_user_tokens(sender,instance,created,**kwargs):
+    """Drop the tokens of an updated or deactivated user from the cache"""
+    if not created:
+        keys=list(Token.objects.filter(user=instance).values_list('key',flat=True))
+        if keys:
+            token_cache.invalidate(*keys)
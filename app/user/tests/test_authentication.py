@@ -0,0 +1,201 @@
+"""Tests for cached token authentication"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase,override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from user.authentication import TokenCache,token_cache
+
+ME_URL=reverse('user:me')
+TOKEN_URL=reverse('user:token')
+REFRESH_URL=reverse('user:token-refresh')
+TOKEN_CACHE_URL=reverse('user:token-cache-stats')
+RECIPIES_URL=reverse('recipie:recipie-list')
+
+def create_user(**params):
+    """Create and return a new user"""
+    return get_user_model().objects.create_user(**params)
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test authenticating with cached tokens"""
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        token_cache.reset_stats()
+        self.user=create_user(email='test@example.com',password='testpass123',name='Test')
+        self.token=Token.objects.create(user=self.user)
+        self.client=APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        
+    def token_queries(self,url=ME_URL):
+        """GET url and return the queries against the token table"""
+        with CaptureQueriesContext(connection) as ctx:
+            res=self.client.get(url)
+        self.assertEqual(res.status_code,status.HTTP_200_OK)
+        return [q for q in ctx.captured_queries if 'authtoken_token' in q['sql']]
+    
+    def test_second_request_skips_token_query(self):
+        """Test only the first request looks the token up"""
+        self.assertEqual(len(self.token_queries()),1)
+        self.assertEqual(len(self.token_queries()),0)
+        self.assertEqual(len(self.token_queries(RECIPIES_URL)),0)
+        
+        stats=token_cache.stats()
+        self.assertEqual((stats['hits'],stats['misses']),(2,1))
+        self.assertAlmostEqual(stats['hit_rate'],2/3)
+        
+    def test_shared_cache_fills_local_cache(self):
+        """Test a cold process finds tokens in the shared cache"""
+        self.token_queries()
+        token_cache.clear()
+        
+        self.assertEqual(len(self.token_queries()),0)
+        self.assertEqual(token_cache.stats()['shared_hits'],1)
+        
+    def test_deleted_token_rejected(self):
+        """Test deleting a token invalidates the cache"""
+        self.token_queries()
+        self.token.delete()
+        
+        res=self.client.get(ME_URL)
+        
+        self.assertEqual(res.status_code,status.HTTP_401_UNAUTHORIZED)
+        
+    def test_deactivated_user_rejected(self):
+        """Test deactivating a user invalidates the cache"""
+        self.token_queries()
+        self.user.is_active=False
+        self.user.save()
+        
+        res=self.client.get(ME_URL)
+        
+        self.assertEqual(res.status_code,status.HTTP_401_UNAUTHORIZED)
+        
+    def test_updated_user_served_fresh(self):
+        """Test updating the profile refreshes the cached user"""
+        self.client.patch(ME_URL,{'name':'Updated'})
+        
+        res=self.client.get(ME_URL)
+        
+        self.assertEqual(res.data['name'],'Updated')
+        
+    def test_update_with_stale_cached_user(self):
+        """Test a write does not save fields back from a stale cached user"""
+        self.token_queries()
+        # Changed by another process, whose invalidation misses this LRU
+        get_user_model().objects.filter(pk=self.user.pk).update(password='changed')
+        
+        res=self.client.patch(ME_URL,{'name':'Updated'})
+        
+        self.assertEqual(res.status_code,status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password,'changed')
+        self.assertEqual(self.user.name,'Updated')
+        
+    def test_lru_evicts_oldest_and_expires(self):
+        """Test the local cache honours its size and TTL"""
+        tokens=TokenCache(maxsize=2,local_ttl=0)
+        for key in 'abc':
+            tokens._remember(tokens._digest(key),{})
+        self.assertEqual(list(tokens._entries),[tokens._digest('b'),tokens._digest('c')])
+        self.assertIsNone(tokens.get('c'))
+        
+    def test_cache_holds_no_credentials(self):
+        """Test the shared cache is keyed by a digest and has no password"""
+        self.token_queries()
+        
+        self.assertIsNone(cache.get(f'user:token:{self.token.key}'))
+        entry=cache.get(f'user:token:{token_cache._digest(self.token.key)}')
+        self.assertEqual(entry['user']['id'],self.user.id)
+        self.assertNotIn('password',entry['user'])
+        self.assertNotIn(self.user.password,repr(entry))
+        
+    def test_stats_endpoint_requires_staff(self):
+        """Test staff can read the token cache counters"""
+        self.token_queries()
+        self.token_queries()
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(TOKEN_CACHE_URL).status_code,302)
+        
+        self.user.is_staff=True
+        self.user.save()
+        res=self.client.get(TOKEN_CACHE_URL)
+        
+        self.assertEqual(res.status_code,status.HTTP_200_OK)
+        self.assertEqual(res.json()['hits'],1)
+        
+        
+@override_settings(SIGNED_TOKENS=True)
+class SignedTokenTests(TestCase):
+    """Test issuing and authenticating with signed tokens"""
+    def setUp(self):
+        cache.clear()
+        self.user=create_user(email='test@example.com',password='testpass123',name='Test')
+        self.client=APIClient()
+        res=self.client.post(TOKEN_URL,{'email':'test@example.com','password':'testpass123'})
+        self.assertEqual(res.status_code,status.HTTP_200_OK)
+        self.tokens=res.data
+        
+    def authenticate(self,token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        
+    def test_token_issued_without_storing(self):
+        """Test signed mode issues tokens without an authtoken row"""
+        self.assertIn('refresh',self.tokens)
+        self.assertEqual(self.tokens['expires_in'],300)
+        self.assertFalse(Token.objects.exists())
+        
+    def test_authentication_needs_no_queries(self):
+        """Test a signed token authenticates without the database"""
+        self.authenticate(self.tokens['token'])
+        with self.assertNumQueries(0):
+            res=self.client.get(ME_URL)
+        self.assertEqual(res.status_code,status.HTTP_200_OK)
+        self.assertEqual(res.data,{'email':'test@example.com','name':'Test'})
+        
+    def test_tampered_and_expired_tokens_rejected(self):
+        """Test bad signatures and expired tokens return 401"""
+        self.authenticate(self.tokens['token']+'x')
+        self.assertEqual(self.client.get(ME_URL).status_code,status.HTTP_401_UNAUTHORIZED)
+        
+        self.authenticate(self.tokens['token'])
+        with self.settings(SIGNED_TOKEN_MAX_AGE=-1):
+            res=self.client.get(ME_URL)
+        self.assertEqual(res.status_code,status.HTTP_401_UNAUTHORIZED)
+        
+    def test_rotated_secret_key_accepted(self):
+        """Test tokens signed with a fallback key keep working"""
+        old_key=settings.SECRET_KEY
+        with self.settings(SECRET_KEY='new-secret',SECRET_KEY_FALLBACKS=[old_key]):
+            self.authenticate(self.tokens['token'])
+            self.assertEqual(self.client.get(ME_URL).status_code,status.HTTP_200_OK)
+            res=self.client.post(REFRESH_URL,{'refresh':self.tokens['refresh']})
+            self.assertEqual(res.status_code,status.HTTP_200_OK)
+        with self.settings(SECRET_KEY='new-secret'):
+            self.assertEqual(self.client.get(ME_URL).status_code,status.HTTP_401_UNAUTHORIZED)
+            
+    def test_refresh_rechecks_user(self):
+        """Test refreshing fails once the user is deactivated or changes password"""
+        res=self.client.post(REFRESH_URL,{'refresh':self.tokens['refresh']})
+        self.assertEqual(res.status_code,status.HTTP_200_OK)
+        self.assertIn('token',res.data)
+        
+        self.user.set_password('otherpass123')
+        self.user.save()
+        res=self.client.post(REFRESH_URL,{'refresh':self.tokens['refresh']})
+        self.assertEqual(res.status_code,status.HTTP_400_BAD_REQUEST)
+        
+    def test_update_profile_with_signed_token(self):
+        """Test profile writes go to the stored user"""
+        self.authenticate(self.tokens['token'])
+        res=self.client.patch(ME_URL,{'name':'Updated'})
+        
+        self.assertEqual(res.status_code,status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name,'Updated')
+        self.assertTrue(self.user.check_password('testpass123'))
@@ -0,0 +1,69 @@
+"""Stateless access and refresh tokens signed with SECRET_KEY"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db import router
+from django.utils.crypto import constant_time_compare,salted_hmac
+
+ACCESS_SALT='user.tokens.access'
+REFRESH_SALT='user.tokens.refresh'
+
+
+def signed_tokens_enabled():
+    """Return True if CreateTokenView issues signed tokens"""
+    return getattr(settings,'SIGNED_TOKENS',False)
+
+def _password_fingerprint(user,secret=None):
+    """Return a digest that changes whenever the user's password changes"""
+    return salted_hmac(REFRESH_SALT,user.password,secret=secret,algorithm='sha256').hexdigest()
+
+def issue_tokens(user):
+    """Return a new access and refresh token pair for user"""
+    access=signing.dumps(
+        {'uid':user.pk,'email':user.email,'name':user.name,'staff':user.is_staff},
+        salt=ACCESS_SALT,
+    )
+    refresh=signing.dumps(
+        {'uid':user.pk,'pwd':_password_fingerprint(user)},
+        salt=REFRESH_SALT,
+    )
+    return {
+        'token':access,
+        'refresh':refresh,
+        'expires_in':settings.SIGNED_TOKEN_MAX_AGE,
+    }
+
+def read_access_token(token):
+    """Return the claims of an access token, raising BadSignature if invalid.
+
+    Tokens signed with a key in SECRET_KEY_FALLBACKS are still accepted,
+    so SECRET_KEY can be rotated without logging every client out.
+    """
+    return signing.loads(token,salt=ACCESS_SALT,max_age=settings.SIGNED_TOKEN_MAX_AGE)
+
+def user_from_claims(claims):
+    """Build the user of an access token without querying the database"""
+    User=get_user_model()
+    return User.from_db(
+        router.db_for_read(User),
+        ['id','email','name','is_active','is_staff'],
+        [claims['uid'],claims['email'],claims['name'],True,claims['staff']],
+    )
+
+def refresh_user(token):
+    """Return the active user of a refresh token, or None"""
+    try:
+        claims=signing.loads(
+            token,
+            salt=REFRESH_SALT,
+            max_age=settings.SIGNED_REFRESH_MAX_AGE,
+        )
+    except signing.BadSignature:
+        return None
+    user=get_user_model().objects.filter(pk=claims['uid'],is_active=True).first()
+    if user is None:
+        return None
+    for secret in [settings.SECRET_KEY,*settings.SECRET_KEY_FALLBACKS]:
+        if constant_time_compare(claims['pwd'],_password_fingerprint(user,secret)):
+            return user
+    return None
@@ -1,8 +1,14 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth import get_user_model
+from django.http import Http404,JsonResponse
 from django.shortcuts import render
-from rest_framework import generics,authentication,permissions
+from rest_framework import generics,permissions
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
-from user.serializers import UserSerializer, AuthTokenSerializer
+from user.authentication import CachedTokenAuthentication,SignedTokenAuthentication,token_cache
+from user.serializers import UserSerializer, AuthTokenSerializer,TokenRefreshSerializer
+from user.tokens import issue_tokens,signed_tokens_enabled
 # Create your views here.
 
 class CreateUserView(generics.CreateAPIView):
@@ -14,12 +20,42 @@ class CreateTokenView(ObtainAuthToken):
     serializer_class=AuthTokenSerializer
     renderer_classes=api_settings.DEFAULT_RENDERER_CLASSES 
     
+    def post(self,request,*args,**kwargs):
+        """Issue signed tokens if enabled, else the stored token"""
+        if not signed_tokens_enabled():
+            return super().post(request,*args,**kwargs)
+        serializer=self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(issue_tokens(serializer.validated_data['user']))
+    
+class RefreshTokenView(generics.GenericAPIView):
+    """Exchange a refresh token for a new pair of signed tokens"""
+    serializer_class=TokenRefreshSerializer
+    authentication_classes=[]
+    permission_classes=[permissions.AllowAny]
+    
+    def post(self,request,*args,**kwargs):
+        if not signed_tokens_enabled():
+            raise Http404
+        serializer=self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(issue_tokens(serializer.validated_data['user']))
+    
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """Manage the authenticated user"""
     serializer_class=UserSerializer
-    authentication_classes=[authentication.TokenAuthentication] #to know wheter the user is authenticated
+    authentication_classes=[SignedTokenAuthentication,CachedTokenAuthentication] #to know wheter the user is authenticated
     permission_classes=[permissions.IsAuthenticated]
     
     def get_object(self):
         """Retrieve and return the authenticated user."""
-        return self.request.user
\ No newline at end of file
+        if self.request.method not in permissions.SAFE_METHODS:
+            # Signed token claims and cached users may be stale, so write
+            # to the stored user rather than saving old fields back
+            return get_user_model().objects.get(pk=self.request.user.pk)
+        return self.request.user
+
+@staff_member_required
+def token_cache_stats(request):
+    """Return the token cache hit counters of this worker process"""
+    return JsonResponse(token_cache.stats())